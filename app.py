@@ -1,30 +1,53 @@
+import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import plotly.express as px
-from preprocessor import preprocess
+import chat_cache
+import ingest
+import search
+from caching import memoize, cache_stats
+from profiling import StageTimer, profile_rerun, PROFILE_ENABLED
 from helpers import (
     GraphStyler,
+    KEYWORDS_DIGEST,
+    activity_for_user,
+    tallies_for_user,
+    build_message_tallies,
+    build_time_index,
+    slice_window,
     get_top_users,
-    get_sentiment,
-    count_words,
-    count_media_messages,
-    count_links,
+    get_message_stats,
+    get_reply_times,
+    build_emoji_stats,
+    build_sessions,
+    user_sessions,
+    SESSION_GAP_MINUTES,
+    build_interactions,
+    user_interactions,
+    emoji_summary,
     get_first_message_date,
     get_last_message_date,
     create_top_users_bar_chart,
     create_wordcloud,
+    get_word_frequencies,
     create_monthly_timeline,
+    create_daily_timeline,
     create_daily_activity_map,
     create_daily_messages_bar_chart,
     create_monthly_day_count_chart,
     create_monthly_message_count_chart,
     create_monthly_area_timeline,
     create_reply_time_analysis,
-    get_toxicity_spam_report,  # NEW IMPORT
+    create_search_hits_chart,
+    create_session_length_chart,
+    create_session_initiators_chart,
+    create_interaction_heatmap,
+    create_interaction_partners_chart,
     create_toxicity_spam_chart  # NEW IMPORT
 )
-import zipfile
-import io
 
 CUSTOM_CSS = """
 @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600;700&display=swap');
@@ -155,37 +178,516 @@ def load_css(css_text):
     st.markdown(f'<style>{css_text}</style>', unsafe_allow_html=True)
 
 
-def get_chat_data_from_file(uploaded_file):
-    file_type = uploaded_file.name.split('.')[-1].lower()
+def get_chat_members(uploaded_file):
+    try:
+        return ingest.chat_members(uploaded_file)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+
 
-    if file_type == 'zip':
-        try:
-            with zipfile.ZipFile(uploaded_file, 'r') as z:
+CHART_BUILDERS = {
+    "top_users": create_top_users_bar_chart,
+    "reply_time": create_reply_time_analysis,
+    "monthly_timeline": create_monthly_timeline,
+    "monthly_area_timeline": create_monthly_area_timeline,
+    "daily_timeline": create_daily_timeline,
+    "daily_messages": create_daily_messages_bar_chart,
+    "monthly_message_count": create_monthly_message_count_chart,
+    "monthly_day_count": create_monthly_day_count_chart,
+    "activity_heatmap": create_daily_activity_map,
+    "session_length": create_session_length_chart,
+    "session_initiators": create_session_initiators_chart,
+    "interaction_heatmap": create_interaction_heatmap,
+    "interaction_speed": functools.partial(create_interaction_heatmap, weight="median_minutes"),
+    "interaction_partners": create_interaction_partners_chart,
+}
 
-                txt_files = [f for f in z.namelist() if f.endswith('.txt')]
-                if not txt_files:
-                    st.error("No WhatsApp chat (.txt) file found inside the ZIP archive.")
-                    return None
+BASE_THEME = "Dark"
+CHART_WORKERS = 4
+DASHBOARD_TABS = ["Activity", "Conversations", "Calendar", "Sentiment & Safety", "Words", "Search"]
+ALL_CHATS = "All chats (combined)"
 
-                with z.open(txt_files[0]) as f:
-                    return f.read().decode("utf-8")
-        except zipfile.BadZipFile:
-            st.error("The uploaded file is a corrupted or invalid ZIP archive.")
-            return None
-        except UnicodeDecodeError:
-            st.error("Could not decode file inside ZIP. Ensure it is a UTF-8 encoded text file.")
-            return None
 
-    elif file_type == 'txt':
-        try:
-            return uploaded_file.getvalue().decode("utf-8")
-        except UnicodeDecodeError:
-            st.error("Could not decode file. Ensure it is a UTF-8 encoded text file.")
-            return None
+def get_upload_key(uploaded_file):
+    upload_keys = st.session_state.setdefault("upload_keys", {})
+    if uploaded_file.file_id not in upload_keys:
+        upload_keys[uploaded_file.file_id] = chat_cache.upload_key(uploaded_file, salt=KEYWORDS_DIGEST)
+    return upload_keys[uploaded_file.file_id]
 
-    else:
-        st.error("Unsupported file type. Please upload a .txt or .zip file.")
+
+@memoize(resource=True)
+def load_chat(cache_key, _raw_data):
+    return ingest.load_chat(cache_key, _raw_data)
+
+
+@memoize(resource=True)
+def combine_chats(cache_key, _chats):
+    return ingest.combine_chats(_chats)
+
+
+def load_upload(cache_key, uploaded_file, members, selected_members):
+    # Returns the key the selection is cached under and its (df, activity, tallies).
+    # A .txt or single-chat zip keeps the upload key; files of a multi-chat zip get their own.
+    if len(members) == 1:
+        return cache_key, load_chat(cache_key, ingest.get_chat_data_from_file(uploaded_file, members[0]))
+
+    keys = [ingest.member_key(cache_key, member) for member in selected_members]
+    chats = [load_chat(key, ingest.get_chat_data_from_file(uploaded_file, member))
+             for key, member in zip(keys, selected_members)]
+    if len(chats) == 1:
+        return keys[0], chats[0]
+    combined_key = ingest.member_key(cache_key, ALL_CHATS)
+    return combined_key, combine_chats(combined_key, chats)
+
+
+def window_range(window):
+    # window is an inclusive (first day, last day) pair, or None for the whole chat.
+    if window is None:
+        return None, None
+    return pd.Timestamp(window[0]), pd.Timestamp(window[1] + datetime.timedelta(days=1))
+
+
+@memoize(resource=True)
+def get_time_index(cache_key, _df):
+    return build_time_index(_df)
+
+
+@memoize(resource=True)
+def get_user_frame(cache_key, selected_user, window, _df, _time_index):
+    if selected_user == "Overall Chat" and window is None:
+        return _df
+    return slice_window(_df, _time_index, selected_user, *window_range(window))
+
+
+@memoize(resource=True)
+def get_user_activity(cache_key, selected_user, window, _cube):
+    return activity_for_user(_cube, selected_user, *window_range(window))
+
+
+@memoize(resource=True)
+def get_window_tallies(cache_key, window, _window_df, _tallies):
+    # The stored tallies cover the whole chat; a narrower window re-labels only its own rows.
+    if window is None:
+        return _tallies
+    return build_message_tallies(_window_df)
+
+
+@memoize(resource=True)
+def get_search_index(cache_key, _df):
+    return search.build_search_index(_df)
+
+
+@memoize
+def search_chat(cache_key, query, selected_user, window, _index):
+    return search.search_messages(_index, query, selected_user, *window_range(window))
+
+
+@memoize
+def get_reply_stats(cache_key, window, _window_df):
+    # One pass over the whole window covers every user, so switching users is a row lookup.
+    return get_reply_times(_window_df)
+
+
+@memoize
+def get_session_table(cache_key, window, gap_minutes, _window_df):
+    return build_sessions(_window_df, gap_minutes)
+
+
+@memoize
+def get_user_sessions(cache_key, selected_user, window, gap_minutes, _session_table):
+    return user_sessions(_session_table, selected_user)
+
+
+@memoize
+def get_interactions(cache_key, window, _window_df):
+    return build_interactions(_window_df)
+
+
+@memoize
+def get_user_interactions(cache_key, selected_user, window, _interactions):
+    return user_interactions(_interactions, selected_user)
+
+
+@memoize
+def get_emoji_stats(cache_key, window, _window_df):
+    # Per-user emoji counts for the whole window; the selected user is filtered afterwards.
+    return build_emoji_stats(_window_df)
+
+
+@memoize
+def get_user_word_frequencies(cache_key, selected_user, window, _filtered_df):
+    return get_word_frequencies(_filtered_df['Message'])
+
+
+@memoize
+def get_wordcloud_png(cache_key, selected_user, window, _frequencies):
+    wordcloud = create_wordcloud(_frequencies)
+    return wordcloud.getvalue() if wordcloud is not None else None
+
+
+@memoize
+def build_chart(chart_name, cache_key, selected_user, window, _data):
+    base_styler = GraphStyler()
+    base_styler.update_theme(BASE_THEME)
+    return CHART_BUILDERS[chart_name](_data, base_styler)
+
+
+def render_chart(chart_name, cache_key, selected_user, window, data, styler):
+    fig = build_chart(chart_name, cache_key, selected_user, window, data)
+    if fig is None:
         return None
+    return styler.restyle(fig, BASE_THEME)
+
+
+def show_charts(charts, cache_key, selected_user, window, styler, timer):
+    # charts is a list of (chart_name, title, data, empty_message). Slots are laid out in
+    # order first, then each figure is drawn as soon as its builder finishes.
+    slots = {}
+    for i, (chart_name, title, data, empty_message) in enumerate(charts):
+        if i:
+            st.markdown("---")
+        st.subheader(title)
+        slots[chart_name] = st.empty()
+
+    def build(chart_name, data):
+        with timer.stage(f"build {chart_name}", concurrent=True):
+            return render_chart(chart_name, cache_key, selected_user, window, data, styler)
+
+    # Builders only touch caches, so they can share this rerun's context; all drawing stays here.
+    # The pool is timed as one stage; per-chart stages inside it overlap.
+    attach_context = functools.partial(add_script_run_ctx, ctx=get_script_run_ctx())
+    with timer.stage(f"charts: {', '.join(chart_name for chart_name, *_ in charts)}"), \
+            ThreadPoolExecutor(max_workers=CHART_WORKERS, initializer=attach_context) as pool:
+        futures = {pool.submit(build, chart_name, data): (chart_name, empty_message)
+                   for chart_name, title, data, empty_message in charts}
+        for future in as_completed(futures):
+            chart_name, empty_message = futures[future]
+            fig = future.result()
+            if fig is not None:
+                with timer.stage(f"plotly {chart_name}", concurrent=True):
+                    slots[chart_name].plotly_chart(fig, use_container_width=True)
+            elif empty_message:
+                slots[chart_name].info(empty_message)
+
+
+def render_performance_panel(timer, profile_report):
+    timer.write_log(**timer.context)
+    with st.expander("Performance", expanded=False):
+        if timer.records:
+            st.caption(f"Total measured wall time: {timer.total_wall():.3f}s")
+            st.dataframe(pd.DataFrame(timer.records), use_container_width=True, hide_index=True)
+        if profile_report:
+            st.markdown("##### Profile of this rerun")
+            st.code(profile_report, language="text")
+
+
+def render_dashboard(uploaded_file, styler, timer):
+    with timer.stage("decode upload"):
+        cache_key = get_upload_key(uploaded_file)
+        members = get_chat_members(uploaded_file)
+    timer.context["upload_key"] = cache_key
+
+    if members is None:
+        return
+
+    selected_members = members
+    if len(members) > 1:
+        chosen = st.sidebar.selectbox("Chat file:", members + [ALL_CHATS])
+        if chosen != ALL_CHATS:
+            selected_members = [chosen]
+
+    try:
+        with timer.stage("preprocess + aggregates"):
+            cache_key, (df, activity_cube, tallies) = load_upload(cache_key, uploaded_file, members,
+                                                                  selected_members)
+    except UnicodeDecodeError:
+        st.error("Could not decode file. Ensure it is a UTF-8 or UTF-16 encoded text file.")
+        return
+
+    if df.empty:
+        st.error("No valid WhatsApp chat data found in the uploaded file. Please check the format.")
+        return
+
+    unparsed_rows = df.attrs.get("unparsed_rows", 0)
+    if unparsed_rows:
+        st.warning(f"{unparsed_rows} message(s) had unreadable timestamps and were skipped.")
+
+    user_list = df['User'].unique().tolist()
+    user_list.sort()
+    user_list.insert(0, "Overall Chat")
+
+    selected_user = st.sidebar.selectbox("Analyze data for:", user_list)
+    timer.context["user"] = selected_user
+
+    first_day = df['Date-Time'].iloc[0].date()
+    last_day = df['Date-Time'].iloc[-1].date()
+    window = None
+    if first_day < last_day:
+        start_day, end_day = st.sidebar.slider("Date range:", min_value=first_day, max_value=last_day,
+                                               value=(first_day, last_day), format="DD MMM YYYY")
+        if (start_day, end_day) != (first_day, last_day):
+            window = (start_day, end_day)
+
+    with timer.stage("user slice"):
+        time_index = get_time_index(cache_key, df)
+        window_df = get_user_frame(cache_key, "Overall Chat", window, df, time_index)
+        filtered_df = get_user_frame(cache_key, selected_user, window, df, time_index)
+
+    if selected_user != "Overall Chat":
+        st.header(f"Analysis for {selected_user}")
+    else:
+        st.header("Overall Chat Summary")
+
+    if filtered_df.empty:
+        st.info("No messages in the selected date range.")
+        return
+
+    st.subheader("Key Metrics")
+    col1, col2, col3, col4 = st.columns(4)
+
+    with timer.stage("key metrics"):
+        metrics = get_message_stats(filtered_df)
+    total_messages = metrics["total_messages"]
+    total_words = metrics["total_words"]
+    media_count = metrics["media_count"]
+    link_count = metrics["link_count"]
+    first_date = get_first_message_date(window_df)
+    last_date = get_last_message_date(window_df)
+
+    with col1:
+        st.markdown(f"""
+            <div class="dashboard-card">
+                <div class="card-title">Total Messages</div>
+                <div class="card-value">{total_messages}</div>
+                <p style="font-size:0.9em; color:#8696A0;">Last Message: {last_date.split(',')[0]}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        avg_words_per_msg = round(total_words / total_messages, 1) if total_messages else 0
+        st.markdown(f"""
+            <div class="dashboard-card">
+                <div class="card-title">Total Words</div>
+                <div class="card-value">{total_words}</div>
+                <p style="font-size:0.9em; color:#8696A0;">Avg. {avg_words_per_msg} words/msg</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        media_percentage = round(media_count / total_messages * 100, 1) if total_messages else 0
+        st.markdown(f"""
+            <div class="dashboard-card">
+                <div class="card-title">Media Messages</div>
+                <div class="card-value">{media_count}</div>
+                <p style="font-size:0.9em; color:#8696A0;">{media_percentage}% of total</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with col4:
+        st.markdown(f"""
+            <div class="dashboard-card">
+                <div class="card-title">Links Shared</div>
+                <div class="card-value">{link_count}</div>
+                <p style="font-size:0.9em; color:#8696A0;">Started: {first_date.split(',')[0]}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown("<h2 style='color:#25D366; margin-top: 30px;'>Graphs and Patterns</h2>", unsafe_allow_html=True)
+
+    # Only the open tab runs; switching tabs reruns the script with the new selection.
+    activity_tab, conversations_tab, calendar_tab, sentiment_tab, words_tab, search_tab = st.tabs(
+        DASHBOARD_TABS, key="dashboard_tab", on_change="rerun")
+
+    with activity_tab:
+        if activity_tab.open:
+            render_activity_section(cache_key, selected_user, window, window_df, filtered_df, activity_cube,
+                                    styler, timer)
+    with conversations_tab:
+        if conversations_tab.open:
+            render_conversations_section(cache_key, selected_user, window, window_df, styler, timer)
+    with calendar_tab:
+        if calendar_tab.open:
+            render_calendar_section(cache_key, selected_user, window, activity_cube, styler, timer)
+    with sentiment_tab:
+        if sentiment_tab.open:
+            with timer.stage("sentiment tallies"):
+                window_tallies = get_window_tallies(cache_key, window, window_df, tallies)
+            render_sentiment_section(window_tallies, selected_user, styler, timer)
+    with words_tab:
+        if words_tab.open:
+            render_words_section(cache_key, selected_user, window, window_df, filtered_df, timer)
+    with search_tab:
+        if search_tab.open:
+            render_search_section(cache_key, selected_user, window, df, styler, timer)
+
+
+def render_activity_section(cache_key, selected_user, window, window_df, filtered_df, activity_cube, styler, timer):
+    with timer.stage("reply times"):
+        reply_stats = get_reply_stats(cache_key, window, window_df)
+
+    activity = get_user_activity(cache_key, selected_user, window, activity_cube)
+
+    if selected_user == "Overall Chat":
+        show_charts([
+            ("top_users", "Top Active Users", filtered_df, None),
+            ("reply_time", "Reply Time Analysis", reply_stats,
+             "Reply time analysis requires a chat with at least two active users."),
+            ("daily_timeline", "Daily Activity", activity, None),
+        ], cache_key, selected_user, window, styler, timer)
+        return
+
+    show_charts([
+        ("monthly_timeline", f"{selected_user}'s Activity Timeline (Line Plot)", activity, None),
+        ("monthly_area_timeline", f"{selected_user}'s Activity Timeline (Area Plot)", activity, None),
+        ("daily_timeline", f"{selected_user}'s Daily Activity", activity, None),
+    ], cache_key, selected_user, window, styler, timer)
+
+    st.markdown("---")
+    st.subheader(f"{selected_user}'s Reply Time")
+    if reply_stats is not None and selected_user in reply_stats.index:
+        user_replies = reply_stats.loc[selected_user]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Median Reply", f"{user_replies['median_minutes']:.0f} min")
+        col2.metric("90th Percentile", f"{user_replies['p90_minutes']:.0f} min")
+        col3.metric("Replies", int(user_replies['replies']))
+    else:
+        st.info(f"No replies from {selected_user} to other users were found.")
+
+
+def render_conversations_section(cache_key, selected_user, window, window_df, styler, timer):
+    gap_minutes = st.number_input("Session gap (minutes)", min_value=1, max_value=24 * 60,
+                                  value=SESSION_GAP_MINUTES, step=15, key="session_gap",
+                                  help="A new conversation starts after this much silence.")
+    with timer.stage("sessions"):
+        session_table = get_session_table(cache_key, window, gap_minutes, window_df)
+        sessions = get_user_sessions(cache_key, selected_user, window, gap_minutes, session_table)
+    if sessions.empty:
+        st.info("No conversations found for this selection.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Conversations", f"{len(sessions):,}")
+    median_duration = sessions['Duration'].median()
+    col2.metric("Median Length", f"{median_duration / 60:.1f} h" if median_duration >= 60 else f"{median_duration:.0f} min")
+    col3.metric("Median Messages", f"{sessions['Messages'].median():.0f}")
+    if selected_user != "Overall Chat":
+        started = int((sessions['Initiator'] == selected_user).sum())
+        st.caption(f"{selected_user} started {started:,} of these conversations ({started / len(sessions):.0%}).")
+
+    charts = [("session_length", "Conversation Length", sessions, None)]
+    if selected_user == "Overall Chat":
+        charts.append(("session_initiators", "Who Starts Conversations", sessions, None))
+    show_charts(charts, cache_key, selected_user, (window, gap_minutes), styler, timer)
+
+    st.markdown("---")
+    with timer.stage("interactions"):
+        interactions = get_interactions(cache_key, window, window_df)
+    if interactions is None or interactions.empty:
+        st.info("Interaction analysis requires a chat with at least two active users.")
+        return
+    if selected_user == "Overall Chat":
+        weighting = st.radio("Weight interactions by", ["Replies", "Reply speed"], horizontal=True,
+                             key="interaction_weight")
+        chart_name = "interaction_heatmap" if weighting == "Replies" else "interaction_speed"
+        show_charts([(chart_name, "Who Replies to Whom", interactions, None)],
+                    cache_key, selected_user, window, styler, timer)
+    else:
+        partners = get_user_interactions(cache_key, selected_user, window, interactions)
+        show_charts([("interaction_partners", f"{selected_user}'s Conversation Partners", partners,
+                      f"No replies between {selected_user} and other users were found.")],
+                    cache_key, selected_user, window, styler, timer)
+
+
+def render_calendar_section(cache_key, selected_user, window, activity_cube, styler, timer):
+    activity = get_user_activity(cache_key, selected_user, window, activity_cube)
+    show_charts([
+        ("daily_messages", "Daily Message Activity (Day of Week)", activity, None),
+        ("monthly_message_count", "Message Activity by Month Number (1-12)", activity, None),
+        ("monthly_day_count", "Message Activity by Day of Month", activity, None),
+        ("activity_heatmap", "Chat Activity Heatmap (Day vs. Hour)", activity, None),
+    ], cache_key, selected_user, window, styler, timer)
+
+
+def render_sentiment_section(tallies, selected_user, styler, timer):
+    sentiment_counts, toxicity_report = tallies_for_user(tallies, selected_user)
+
+    st.subheader("Sentiment Summary")
+    sentiment_df = pd.DataFrame(sentiment_counts.items(), columns=['Sentiment', 'Count'])
+
+    fig_sentiment = px.pie(sentiment_df, values='Count', names='Sentiment',
+                           color_discrete_sequence=['#25D366', '#075E54', '#8696A0'])
+    fig_sentiment.update_traces(textposition='inside', textinfo='percent+label')
+    fig_sentiment = styler.style_graph(fig_sentiment, '', '')
+    fig_sentiment.update_layout(title_text='Sentiment Breakdown')
+    with timer.stage("plotly sentiment"):
+        st.plotly_chart(fig_sentiment, use_container_width=True)
+
+    st.markdown("---")
+    st.subheader("Toxicity and Spam Detection Report")
+    fig_toxicity = create_toxicity_spam_chart(toxicity_report, styler)
+    with timer.stage("plotly toxicity"):
+        st.plotly_chart(fig_toxicity, use_container_width=True)
+
+
+def render_words_section(cache_key, selected_user, window, window_df, filtered_df, timer):
+    st.subheader("Word Frequency Analysis")
+
+    st.markdown("##### Most Used Words")
+    with timer.stage("word frequencies"):
+        frequencies = get_user_word_frequencies(cache_key, selected_user, window, filtered_df)
+    with timer.stage("word cloud"):
+        wordcloud_img = get_wordcloud_png(cache_key, selected_user, window, frequencies)
+    if wordcloud_img is not None:
+        st.image(wordcloud_img, use_container_width=True, caption="Visual representation of frequent words")
+    else:
+        st.info("No words to show for this selection.")
+
+    st.markdown("##### Most Used Emojis")
+    with timer.stage("emoji stats"):
+        emoji_stats = get_emoji_stats(cache_key, window, window_df)
+    top_emojis, total_emojis, per_message = emoji_summary(emoji_stats, selected_user)
+    if total_emojis:
+        col1, col2 = st.columns(2)
+        col1.metric("Emojis Sent", f"{total_emojis:,}")
+        col2.metric("Emojis per Message", f"{per_message:.2f}")
+        items = "".join(f'<div class="emoji-item">{emoji_char}<br><span style="font-size:0.5em;">{count:,}</span></div>'
+                        for emoji_char, count in top_emojis.items())
+        st.markdown(f'<div class="emoji-grid">{items}</div>', unsafe_allow_html=True)
+    else:
+        st.info("No emojis to show for this selection.")
+
+
+def render_search_section(cache_key, selected_user, window, df, styler, timer):
+    query = st.text_input("Search messages", key="search_query",
+                          placeholder='keyword, "exact phrase" or prefix*')
+    if not query.strip():
+        st.caption("Results follow the user and date range chosen in the sidebar.")
+        return
+
+    with timer.stage("search index"):
+        index = get_search_index(cache_key, df)
+    with timer.stage("search"):
+        rows = search_chat(cache_key, query, selected_user, window, index)
+
+    if len(rows) == 0:
+        st.info("No messages match this search.")
+        return
+
+    pages = (len(rows) - 1) // search.RESULTS_PER_PAGE + 1
+    st.caption(f"{len(rows)} matching message(s)")
+    # The page box is driven by its session state key alone: seeded on first use and pulled
+    # back when a new query has fewer pages than the one it was left on.
+    st.session_state.setdefault("search_page", 1)
+    if st.session_state["search_page"] > pages:
+        st.session_state["search_page"] = pages
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="search_page")
+    st.dataframe(search.results_page(index, rows, page), use_container_width=True, hide_index=True)
+
+    st.subheader("Matches per Month")
+    with timer.stage("build search_hits"):
+        fig = create_search_hits_chart(search.monthly_hits(index, rows), styler)
+    st.plotly_chart(fig, use_container_width=True)
 
 
 def main_app():
@@ -209,161 +711,35 @@ def main_app():
     styler = GraphStyler()
     styler.update_theme(selected_theme)
 
-    st.sidebar.markdown("---")
-
-    st.title("WhatsApp Chat Analyzer Dashboard")
-    st.markdown("Upload a file to start the analysis.")
-
-    if uploaded_file is not None:
-
-        raw_data = get_chat_data_from_file(uploaded_file)
-
-        if raw_data is None:
-            return
-
-        df = preprocess(raw_data)
+    if st.sidebar.button("Clear cached chats"):
+        removed = chat_cache.purge()
+        st.sidebar.success(f"Removed {removed} cached chat(s).")
 
-        if df.empty:
-            st.error("No valid WhatsApp chat data found in the uploaded file. Please check the format.")
-            return
-
-        user_list = df['User'].unique().tolist()
-        user_list.sort()
-        user_list.insert(0, "Overall Chat")
-
-        selected_user = st.sidebar.selectbox("Analyze data for:", user_list)
-
-        if selected_user != "Overall Chat":
-            filtered_df = df[df['User'] == selected_user]
-            st.header(f"Analysis for {selected_user}")
+    with st.sidebar.expander("Cache statistics"):
+        stats = cache_stats()
+        if stats:
+            st.table(pd.DataFrame.from_dict(stats, orient='index'))
         else:
-            filtered_df = df
-            st.header("Overall Chat Summary")
-
-        st.subheader("Key Metrics")
-        col1, col2, col3, col4 = st.columns(4)
-
-        total_messages = len(filtered_df)
-        total_words = count_words(filtered_df['Message'])
-        media_count = count_media_messages(filtered_df['Message'])
-        link_count = count_links(filtered_df['Message'])
-        first_date = get_first_message_date(df)
-        last_date = get_last_message_date(df)
-
-        with col1:
-            st.markdown(f"""
-                <div class="dashboard-card">
-                    <div class="card-title">Total Messages</div>
-                    <div class="card-value">{total_messages}</div>
-                    <p style="font-size:0.9em; color:#8696A0;">Last Message: {last_date.split(',')[0]}</p>
-                </div>
-            """, unsafe_allow_html=True)
-
-        with col2:
-            avg_words_per_msg = round(total_words / total_messages, 1) if total_messages else 0
-            st.markdown(f"""
-                <div class="dashboard-card">
-                    <div class="card-title">Total Words</div>
-                    <div class="card-value">{total_words}</div>
-                    <p style="font-size:0.9em; color:#8696A0;">Avg. {avg_words_per_msg} words/msg</p>
-                </div>
-            """, unsafe_allow_html=True)
-
-        with col3:
-            media_percentage = round(media_count / total_messages * 100, 1) if total_messages else 0
-            st.markdown(f"""
-                <div class="dashboard-card">
-                    <div class="card-title">Media Messages</div>
-                    <div class="card-value">{media_count}</div>
-                    <p style="font-size:0.9em; color:#8696A0;">{media_percentage}% of total</p>
-                </div>
-            """, unsafe_allow_html=True)
-
-        with col4:
-            st.markdown(f"""
-                <div class="dashboard-card">
-                    <div class="card-title">Links Shared</div>
-                    <div class="card-value">{link_count}</div>
-                    <p style="font-size:0.9em; color:#8696A0;">Started: {first_date.split(',')[0]}</p>
-                </div>
-            """, unsafe_allow_html=True)
-
-        st.markdown("<h2 style='color:#25D366; margin-top: 30px;'>Graphs and Patterns</h2>", unsafe_allow_html=True)
-
-        st.markdown("---")
-        if selected_user == "Overall Chat":
-            st.subheader("Top Active Users")
-            fig_top_users = create_top_users_bar_chart(filtered_df, styler)
-            st.plotly_chart(fig_top_users, use_container_width=True)
+            st.caption("No cached computations yet.")
 
-            st.markdown("---")
-            st.subheader("Average Reply Time Analysis")
-            fig_reply_time = create_reply_time_analysis(df, styler)
-            if fig_reply_time:
-                st.plotly_chart(fig_reply_time, use_container_width=True)
-            else:
-                st.info("Reply time analysis requires a chat with at least two active users.")
-
-        else:
-            st.subheader(f"{selected_user}'s Activity Timeline (Line Plot)")
-            fig_timeline = create_monthly_timeline(filtered_df, styler)
-            st.plotly_chart(fig_timeline, use_container_width=True)
+    profiling_on = st.sidebar.toggle("Performance profiling", value=PROFILE_ENABLED)
+    capture_profile = profiling_on and st.sidebar.button("Profile this rerun")
 
-            st.markdown("---")
-            st.subheader(f"{selected_user}'s Activity Timeline (Area Plot)")
-            fig_area_timeline = create_monthly_area_timeline(filtered_df, styler)
-            st.plotly_chart(fig_area_timeline, use_container_width=True)
-
-        st.markdown("---")
-        st.subheader("Daily Message Activity (Day of Week)")
-        fig_daily_bar = create_daily_messages_bar_chart(filtered_df, styler)
-        st.plotly_chart(fig_daily_bar, use_container_width=True)
-
-        st.markdown("---")
-        st.subheader("Message Activity by Month Number (1-12)")
-        fig_monthly_num = create_monthly_message_count_chart(filtered_df, styler)
-        st.plotly_chart(fig_monthly_num, use_container_width=True)
-
-        st.markdown("---")
-        st.subheader("Message Activity by Day of Month")
-        fig_monthly_day = create_monthly_day_count_chart(filtered_df, styler)
-        st.plotly_chart(fig_monthly_day, use_container_width=True)
-
-        st.markdown("---")
-        st.subheader("Sentiment Summary")
-        sentiment_counts = get_sentiment(filtered_df['Message'])
-        sentiment_df = pd.DataFrame(sentiment_counts.items(), columns=['Sentiment', 'Count'])
-
-        fig_sentiment = px.pie(sentiment_df, values='Count', names='Sentiment',
-                               color_discrete_sequence=['#25D366', '#075E54', '#8696A0'])
-        fig_sentiment.update_traces(textposition='inside', textinfo='percent+label')
-        fig_sentiment = styler.style_graph(fig_sentiment, '', '')
-        fig_sentiment.update_layout(title_text='Sentiment Breakdown')
-        st.plotly_chart(fig_sentiment, use_container_width=True)
-
-        # NEW FEATURE: Toxicity and Spam Report
-        st.markdown("---")
-        st.subheader("Toxicity and Spam Detection Report")
-        toxicity_report = get_toxicity_spam_report(filtered_df['Message'])
-        fig_toxicity = create_toxicity_spam_chart(toxicity_report, styler)
-        st.plotly_chart(fig_toxicity, use_container_width=True)
-        # End of New Feature
-
-        st.markdown("---")
-        st.subheader("Chat Activity Heatmap (Day vs. Hour)")
-        fig_heatmap = create_daily_activity_map(filtered_df, styler)
-        st.plotly_chart(fig_heatmap, use_container_width=True)
+    st.sidebar.markdown("---")
 
-        st.markdown("---")
-        st.subheader("Word Frequency Analysis")
+    st.title("WhatsApp Chat Analyzer Dashboard")
+    st.markdown("Upload a file to start the analysis.")
 
-        st.markdown("##### Most Used Words")
-        wordcloud_img = create_wordcloud(filtered_df['Message'])
-        st.image(wordcloud_img, use_container_width=True, caption="Visual representation of frequent words")
+    timer = StageTimer(profiling_on)
 
+    with profile_rerun(capture_profile) as profile:
+        if uploaded_file is not None:
+            render_dashboard(uploaded_file, styler, timer)
+        else:
+            st.info("Upload your WhatsApp chat (.txt or .zip) file to begin. Use the 'Export Chat' option on WhatsApp.")
 
-    else:
-        st.info("Upload your WhatsApp chat (.txt or .zip) file to begin. Use the 'Export Chat' option on WhatsApp.")
+    if timer.enabled:
+        render_performance_panel(timer, profile["report"])
 
     st.markdown("""
         <div class="fixed-footer">
@@ -0,0 +1,166 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from ingest import chat_members, combine_frames, get_chat_data_from_file, open_text
+from preprocessor import preprocess, DAYS_ORDER
+from helpers import (
+    get_message_stats,
+    get_top_users,
+    get_reply_times,
+    build_sessions,
+    get_first_message_date,
+    get_last_message_date,
+    build_activity_cube,
+    build_message_tallies,
+    activity_for_user,
+    tallies_for_user,
+)
+
+CHAT_EXTENSIONS = (".txt", ".zip")
+
+
+def find_exports(inputs):
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.extend(path for path in matches if path.lower().endswith(CHAT_EXTENSIONS) and os.path.isfile(path))
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+def output_name(path):
+    # Exports are often all called "WhatsApp Chat with ...", so the stem alone can collide.
+    stem = re.sub(r"[^\w.-]+", "_", os.path.splitext(os.path.basename(path))[0])
+    return f"{stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def chat_metrics(df):
+    cube = build_activity_cube(df)
+    tallies = build_message_tallies(df, workers=1)
+    activity = activity_for_user(cube)
+    sentiment, toxicity = tallies_for_user(tallies)
+
+    by_day = activity.groupby(activity['date'].dt.day_name())['Count'].sum().reindex(DAYS_ORDER, fill_value=0)
+    by_hour = activity.groupby('hour')['Count'].sum().reindex(range(24), fill_value=0)
+    reply_times = get_reply_times(df)
+    sessions, _ = build_sessions(df)
+
+    return {
+        "totals": {
+            **get_message_stats(df),
+            "users": int(df['User'].nunique()),
+            "first_message": get_first_message_date(df),
+            "last_message": get_last_message_date(df),
+        },
+        "top_users": {str(user): int(count) for user, count in get_top_users(df).items()},
+        "sentiment": sentiment,
+        "toxicity": toxicity,
+        "activity_by_day": {day: int(count) for day, count in by_day.items()},
+        "activity_by_hour": {str(hour): int(count) for hour, count in by_hour.items()},
+        **{
+            f"reply_time_{column}": {} if reply_times is None
+            else {str(user): round(float(value), 2) if column != "replies" else int(value)
+                  for user, value in reply_times[column].items()}
+            for column in ("median_minutes", "p90_minutes", "replies")
+        },
+        "sessions": {
+            "count": int(len(sessions)),
+            "median_duration_minutes": round(float(sessions['Duration'].median()), 2) if len(sessions) else None,
+            "median_messages": float(sessions['Messages'].median()) if len(sessions) else None,
+        },
+        "sessions_started": {str(user): int(count)
+                             for user, count in sessions['Initiator'].value_counts().items() if count},
+    }
+
+
+def _write(metrics, path, output_format):
+    tmp_path = f"{path}.tmp"
+    if output_format == "json":
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+    else:
+        rows = [(metrics["chat"], section, str(key), value)
+                for section, values in metrics.items() if isinstance(values, dict)
+                for key, value in values.items()]
+        table = pd.DataFrame(rows, columns=["chat", "section", "key", "value"])
+        table["value"] = table["value"].astype(str)
+        table.to_parquet(tmp_path, index=False)
+    # rename last so an interrupted run never leaves a file that looks finished
+    os.replace(tmp_path, path)
+
+
+def analyze_export(path, output_path, output_format):
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            # Exports already run one per worker process, so each parse stays serial.
+            # Zips holding several chats are analyzed as one combined chat.
+            frames = [preprocess(open_text(get_chat_data_from_file(f, member)), workers=1)
+                      for member in chat_members(f)]
+        df = combine_frames(frames)
+        if df.empty:
+            raise ValueError("No valid WhatsApp chat data found.")
+        metrics = {"chat": path, **chat_metrics(df)}
+        _write(metrics, output_path, output_format)
+    except Exception as e:
+        # Corrupt archives surface as zlib.error, encrypted members as RuntimeError; any
+        # failure is recorded against this export and the run goes on.
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    return {"path": path, "messages": len(df), "seconds": round(time.perf_counter() - start, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports without the dashboard.")
+    parser.add_argument("inputs", nargs="+", help="export files, directories or glob patterns (.txt or .zip)")
+    parser.add_argument("-o", "--output-dir", default="batch-results")
+    parser.add_argument("-f", "--format", choices=["json", "parquet"], default="json")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="re-analyze exports that already have results")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    exports = find_exports(args.inputs)
+    jobs = {}
+    for path in exports:
+        output_path = os.path.join(args.output_dir, f"{output_name(path)}.{args.format}")
+        if args.force or not os.path.exists(output_path):
+            jobs[path] = output_path
+
+    skipped = len(exports) - len(jobs)
+    print(f"{len(jobs)} export(s) to analyze, {skipped} already done.")
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(analyze_export, path, output_path, args.format): path
+                   for path, output_path in jobs.items()}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed for running out of memory).
+                result = {"path": futures[future], "error": f"{type(e).__name__}: {e}"}
+            if "error" in result:
+                failures.append(result)
+                print(f"[{done}/{len(jobs)}] FAILED {result['path']}: {result['error']}")
+            else:
+                print(f"[{done}/{len(jobs)}] {result['path']}: {result['messages']} messages in {result['seconds']}s")
+
+    if failures:
+        with open(os.path.join(args.output_dir, "failures.json"), "w", encoding="utf-8") as f:
+            json.dump(failures, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
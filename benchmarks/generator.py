@@ -0,0 +1,66 @@
+import datetime
+import random
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Sneha", "Vikram", "Ananya", "Rohan", "Kavya", "Arjun", "Meera",
+               "Karan", "Isha", "Aditya", "Pooja", "Siddharth", "Neha", "Nikhil", "Riya", "Varun", "Tanvi"]
+
+WORDS = ["hello", "ok", "haha", "yes", "no", "good", "morning", "night", "see", "you", "tomorrow", "class",
+         "exam", "notes", "send", "please", "thanks", "great", "bad", "lol", "where", "are", "we", "meeting",
+         "today", "done", "free", "offer", "click", "here", "stupid", "awesome", "love", "this", "movie", "food"]
+
+EMOJIS = ["😂", "👍", "❤️", "🙏", "😭", "🔥", "😊", "🎉"]
+
+LINKS = ["https://example.com/notes", "www.youtube.com/watch?v=abc", "https://docs.google.com/d/xyz",
+         "check drive.google.com", "results.gov"]
+
+
+def _timestamp(moment, time_format):
+    date = f"{moment.day:02d}/{moment.month:02d}/{moment.year}"
+    if time_format == "12hr":
+        hour = moment.hour % 12 or 12
+        suffix = "am" if moment.hour < 12 else "pm"
+        return f"{date}, {hour}:{moment.minute:02d} {suffix}"
+    return f"{date}, {moment.hour:02d}:{moment.minute:02d}"
+
+
+def generate_chat(n_messages, n_users=8, time_format="24hr", media_ratio=0.05, link_ratio=0.03,
+                  multiline_rate=0.02, start=datetime.datetime(2021, 1, 1, 9, 0), seed=0):
+    # Deterministic for a given set of arguments; yields the export one line at a time so
+    # multi-million message chats never sit in memory.
+    rng = random.Random(seed)
+    users = [f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {i // len(FIRST_NAMES) or ''}".strip()
+             for i in range(n_users)]
+    weights = [1 / (rank + 1) for rank in range(n_users)]
+    moment = start
+
+    yield f"{_timestamp(moment, time_format)} - Messages and calls are end-to-end encrypted. " \
+          f"No one outside of this chat can read or listen to them."
+
+    for _ in range(n_messages):
+        # mostly short bursts with the occasional quiet stretch
+        moment += datetime.timedelta(seconds=rng.expovariate(1 / 240))
+        user = rng.choices(users, weights)[0]
+
+        roll = rng.random()
+        if roll < media_ratio:
+            text = "<Media omitted>"
+        else:
+            words = rng.choices(WORDS, k=rng.randint(1, 12))
+            if roll < media_ratio + link_ratio:
+                words.append(rng.choice(LINKS))
+            if rng.random() < 0.1:
+                words.append(rng.choice(EMOJIS))
+            text = " ".join(words)
+
+        yield f"{_timestamp(moment, time_format)} - {user}: {text}"
+
+        while rng.random() < multiline_rate:
+            yield " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))
+
+
+def write_chat(path, n_messages, **kwargs):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_chat(n_messages, **kwargs):
+            f.write(line)
+            f.write("\n")
+    return path
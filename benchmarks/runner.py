@@ -0,0 +1,170 @@
+import argparse
+import datetime
+import gc
+import inspect
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import helpers
+import search
+from preprocessor import preprocess
+from benchmarks.generator import write_chat
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 5_000_000]
+BENCHMARKED_PREFIXES = ("get_", "build_", "analyze_", "create_")
+RESULTS_DIR = "benchmark-results"
+
+
+MEMORY_NOTE = ("peak_mb is the tracemalloc peak: Python allocations in this process only. pyarrow buffers "
+               "and parse/sentiment worker processes are not counted.")
+
+
+def measure(func, *args, track_memory=True, reset=None):
+    # tracemalloc slows pure-Python stages by an order of magnitude, so wall time comes
+    # from an untraced call and peak memory from a second, traced call.
+    if reset:
+        reset()
+    gc.collect()
+    start_time = time.perf_counter()
+    result = func(*args)
+    wall_time = time.perf_counter() - start_time
+
+    peak = None
+    if track_memory:
+        if reset:
+            reset()
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, wall_time, peak
+
+
+def benchmarked_functions():
+    # Every public metric and chart builder in helpers, so new ones are picked up
+    # without touching the runner.
+    for name, func in inspect.getmembers(helpers, inspect.isfunction):
+        if func.__module__ == helpers.__name__ and name.startswith(BENCHMARKED_PREFIXES):
+            yield name, func
+
+
+def _preprocess_file(path):
+    with open(path, encoding="utf-8") as f:
+        return preprocess(f)
+
+
+def _inputs(df):
+    cube = helpers.build_activity_cube(df)
+    interactions = helpers.build_interactions(df)
+    selected_user = str(df['User'].value_counts().index[0])
+    search_index = search.build_search_index(df)
+    return {
+        "df": df,
+        "messages": df['Message'],
+        "cube": cube,
+        "activity": helpers.activity_for_user(cube),
+        "report_data": helpers.get_toxicity_spam_report(df['Message']),
+        "frequencies": helpers.get_word_frequencies(df['Message']),
+        "reply_stats": helpers.get_reply_times(df),
+        "emoji_stats": helpers.build_emoji_stats(df),
+        "session_table": helpers.build_sessions(df),
+        "sessions": helpers.build_sessions(df)[0],
+        "interactions": interactions,
+        "selected_user": selected_user,
+        "partners": helpers.user_interactions(interactions, selected_user),
+        "hits_by_month": search.monthly_hits(search_index, search.search_messages(search_index, "hello")),
+        "styler": helpers.GraphStyler(),
+    }
+
+
+def _arguments(func, inputs):
+    arguments = []
+    for parameter in inspect.signature(func).parameters.values():
+        if parameter.default is not inspect.Parameter.empty:
+            break
+        if parameter.name not in inputs:
+            return None
+        arguments.append(inputs[parameter.name])
+    return arguments
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, time_format="24hr", only=None, track_memory=True, seed=0):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            path = write_chat(os.path.join(tmp_dir, f"chat_{size}.txt"), size, time_format=time_format, seed=seed)
+
+            def timed(stage, func, *args, reset=None):
+                result, wall_time, peak = measure(func, *args, track_memory=track_memory, reset=reset)
+                results.append({"size": size, "stage": stage, "wall_s": round(wall_time, 4),
+                                 "peak_mb": round(peak / (1 << 20), 2) if peak is not None else None})
+                print(f"{size:>10,} {stage:<40} {wall_time:9.3f}s")
+                return result
+
+            df = timed("preprocess", _preprocess_file, path)
+
+            inputs = _inputs(df)
+            skipped = []
+            for name, func in benchmarked_functions():
+                if only and only not in name:
+                    continue
+                arguments = _arguments(func, inputs)
+                if arguments is None:
+                    skipped.append(name)
+                    continue
+                timed(name, func, *arguments, reset=helpers._polarity_cache.clear)
+            if skipped:
+                print(f"Skipped (no input for their parameters): {', '.join(skipped)}")
+
+            del df, inputs
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat analysis pipeline on synthetic exports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="message counts to test")
+    parser.add_argument("--time-format", choices=["12hr", "24hr"], default="24hr")
+    parser.add_argument("--only", help="run only stages whose name contains this text")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc peak-memory tracking")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write (default: benchmark-results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    started = datetime.datetime.now()
+    if not args.no_memory:
+        print(MEMORY_NOTE)
+    results = run_benchmarks(args.sizes, args.time_format, args.only, not args.no_memory, args.seed)
+
+    output = args.output or os.path.join(RESULTS_DIR, started.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "started": started.isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "time_format": args.time_format,
+            "memory_note": None if args.no_memory else MEMORY_NOTE,
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import functools
+import os
+import threading
+from collections import Counter
+
+import streamlit as st
+
+CACHE_MAX_ENTRIES = int(os.environ.get("ANALYZER_CACHE_MAX_ENTRIES", 64))
+CACHE_TTL = int(os.environ.get("ANALYZER_CACHE_TTL", 3600))
+
+_calls = Counter()
+_misses = Counter()
+_lock = threading.Lock()
+
+
+def memoize(func=None, *, resource=False):
+    # st.cache_resource hands back the shared object (no copy); use it for frames that
+    # are only read. Everything else goes through st.cache_data, which returns a copy.
+    def decorate(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            with _lock:
+                _misses[name] += 1
+            return func(*args, **kwargs)
+
+        cache = st.cache_resource if resource else st.cache_data
+        cached = cache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                _calls[name] += 1
+            return cached(*args, **kwargs)
+
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def cache_stats():
+    with _lock:
+        return {name: {"hits": _calls[name] - _misses[name], "misses": _misses[name]}
+                for name in sorted(_calls)}
@@ -0,0 +1,147 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from preprocessor import PARSER_VERSION
+
+CACHE_DIR = os.environ.get("CHAT_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "whatsapp-chat-analyzer"))
+MAX_CACHE_BYTES = int(os.environ.get("CHAT_CACHE_MAX_BYTES", 1 << 30))
+
+_BLOCK_SIZE = 1 << 20
+# Temp files older than this were left by a writer that died before renaming them.
+STALE_TMP_SECONDS = 3600
+
+
+def upload_key(fileobj, salt=""):
+    # salt covers anything else the cached results depend on, e.g. the keyword lists.
+    digest = hashlib.sha256(f"parser-v{PARSER_VERSION}:{salt}:".encode())
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(_BLOCK_SIZE), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def _path(key, cache_dir=CACHE_DIR, part=None):
+    name = f"{key}.parquet" if part is None else f"{key}.{part}.parquet"
+    return os.path.join(cache_dir, name)
+
+
+def load(key, cache_dir=CACHE_DIR, part=None):
+    path = _path(key, cache_dir, part)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+        # reads refresh the mtime so eviction is least-recently-used
+        os.utime(path)
+    except FileNotFoundError:
+        # evicted by another session between the exists check and here
+        return None
+    except (OSError, ValueError):
+        return None
+    return df
+
+
+def store(key, df, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, part=None):
+    path = _path(key, cache_dir, part)
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Sessions are threads of one process, so the temp name must be unique per writer.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        os.close(fd)
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            _remove(tmp_path)
+        return
+    evict(max_bytes, cache_dir)
+
+
+def _remove(path):
+    # Another session may have evicted the same file first.
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def load_manifest(chat_id, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f"{chat_id}.manifest.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(chat_id, manifest, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f"{chat_id}.manifest.json")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    except OSError:
+        pass
+
+
+def _entries(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith((".parquet", ".manifest.json", ".tmp")):
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    return sorted(entries)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, cache_dir=CACHE_DIR):
+    entries = _entries(cache_dir)
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    stale_before = time.time() - STALE_TMP_SECONDS
+    for mtime, size, name in entries:
+        if name.endswith(".tmp"):
+            # In-flight writes are left alone; leftovers of killed writers always go.
+            if mtime < stale_before:
+                _remove(os.path.join(cache_dir, name))
+                total -= size
+                removed += 1
+            continue
+        if total <= max_bytes:
+            continue
+        _remove(os.path.join(cache_dir, name))
+        total -= size
+        removed += 1
+    return removed
+
+
+def purge(cache_dir=CACHE_DIR):
+    return evict(0, cache_dir)
+
+
+def cache_size(cache_dir=CACHE_DIR):
+    return sum(size for _, size, _ in _entries(cache_dir))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the parsed WhatsApp chat cache.")
+    parser.add_argument("--purge", action="store_true", help="delete every cached chat")
+    args = parser.parse_args()
+
+    if args.purge:
+        print(f"Removed {purge()} cached chat(s) from {CACHE_DIR}")
+    else:
+        print(f"{len(_entries())} cached chat(s), {cache_size() / (1 << 20):.1f} MB in {CACHE_DIR}")
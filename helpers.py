@@ -1,11 +1,23 @@
 import re
+import os
+import hashlib
+import functools
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from collections import Counter
-from textblob import TextBlob
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from wordcloud import WordCloud, STOPWORDS
-import matplotlib.pyplot as plt
+import emoji
+import pyarrow as pa
+import pyarrow.compute as pc
 import io
+from preprocessor import MEDIA_PLACEHOLDER, DAYS_ORDER, PROCESS_CONTEXT
+from polarity import score_polarities
 
 
 class GraphStyler:
@@ -50,12 +62,22 @@ class GraphStyler:
 
     }
         }
+        self.theme_name = "Dark"
         self.current_theme = self.themes["Dark"]
 
     def update_theme(self, theme_name):
         if theme_name in self.themes:
+            self.theme_name = theme_name
             self.current_theme = self.themes[theme_name]
 
+    def restyle(self, fig, source_theme="Dark"):
+        # Recolour a figure built under source_theme without recomputing its data.
+        if source_theme == self.theme_name:
+            return fig
+        source = self.themes[source_theme]
+        swap = {source[key]: self.current_theme[key] for key in source}
+        return go.Figure(_swap_colors(fig.to_dict(), swap))
+
     def get_color_sequence(self, n):
         if self.current_theme == self.themes["Cyberpunk"]:
             return ['#FF33FF', '#00FFFF', '#00FF00', '#FFFF00']
@@ -95,6 +117,16 @@ class GraphStyler:
         return fig
 
 
+def _swap_colors(node, swap):
+    if isinstance(node, dict):
+        return {key: _swap_colors(value, swap) for key, value in node.items()}
+    if isinstance(node, (list, tuple)):
+        return [_swap_colors(value, swap) for value in node]
+    if isinstance(node, str):
+        return swap.get(node, node)
+    return node
+
+
 def get_last_message_date(df):
     return df.iloc[-1]['Date-Time'].strftime('%d %b, %Y %I:%M %p') if not df.empty else "N/A"
 
@@ -103,119 +135,368 @@ def get_first_message_date(df):
     return df.iloc[0]['Date-Time'].strftime('%d %b, %Y %I:%M %p') if not df.empty else "N/A"
 
 
-def count_words(messages):
-    return sum(len(str(msg).split()) for msg in messages)
+def get_message_stats(df):
+    return {
+        "total_messages": len(df),
+        "total_words": int(df['word_count'].sum()),
+        "media_count": int(df['is_media'].sum()),
+        "link_count": int(df['has_link'].sum()),
+        "total_chars": int(df['char_len'].sum()),
+    }
+
+
+SENTIMENT_WORKERS = os.cpu_count() or 1
+SENTIMENT_CHUNK_SIZE = 2_000
+# Serial TextBlob scoring runs at about 0.18 ms per text, and a sentiment worker takes about
+# 0.55 s to start. Below this many unscored texts (~3.5 s serial), the first call could not
+# win back a cold 4-worker start even if the workers started one after another.
+PARALLEL_SENTIMENT_THRESHOLD = 20_000
+POLARITY_CACHE_SIZE = 500_000
+
+# Polarity per distinct message text, shared by every rerun, user and session in the process.
+_polarity_cache = {}
+_polarity_lock = threading.Lock()
+
+
+# One pool for the whole process: workers are started on first use and reused by every
+# later call, rerun and session.
+_sentiment_pool = None
+_sentiment_pool_lock = threading.Lock()
+
+
+def _get_sentiment_pool(workers):
+    global _sentiment_pool
+    with _sentiment_pool_lock:
+        if _sentiment_pool is None:
+            _sentiment_pool = ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT)
+        return _sentiment_pool
+
+
+def _score_in_pool(missing, workers, chunk_size):
+    global _sentiment_pool
+    pool = _get_sentiment_pool(workers)
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    try:
+        return [score for chunk_scores in pool.map(score_polarities, chunks) for score in chunk_scores]
+    except BrokenProcessPool:
+        # A worker died; drop the pool so the next call starts a fresh one.
+        with _sentiment_pool_lock:
+            if _sentiment_pool is pool:
+                _sentiment_pool = None
+        return score_polarities(missing)
+
+
+def get_polarities(messages, workers=SENTIMENT_WORKERS, chunk_size=SENTIMENT_CHUNK_SIZE):
+    unique = set(messages)
+    with _polarity_lock:
+        polarities = {msg: _polarity_cache[msg] for msg in unique if msg in _polarity_cache}
+    missing = [msg for msg in unique if msg not in polarities]
+
+    if workers > 1 and len(missing) >= PARALLEL_SENTIMENT_THRESHOLD:
+        scores = _score_in_pool(missing, workers, chunk_size)
+    else:
+        scores = score_polarities(missing)
 
+    fresh = dict(zip(missing, scores))
+    polarities.update(fresh)
 
-def count_media_messages(messages):
-    return sum(1 for msg in messages if "<Media omitted>" in str(msg))
+    with _polarity_lock:
+        _polarity_cache.update(fresh)
+        overflow = len(_polarity_cache) - POLARITY_CACHE_SIZE
+        for msg in list(itertools.islice(_polarity_cache, max(overflow, 0))):
+            del _polarity_cache[msg]
 
+    return polarities
 
-def count_links(messages):
-    url_pattern = r'https?://\S+|www\.\S+|\b[a-zA-Z0-9.-]+\.(com|org|net|in|gov|edu|info)\b'
-    return sum(1 for msg in messages if re.search(url_pattern, str(msg)))
 
+def _sentiment_label(polarity):
+    if polarity > 0.1:
+        return "Positive"
+    elif polarity < -0.1:
+        return "Negative"
+    return "Neutral"
 
-def get_sentiment(messages):
+
+def get_sentiment(messages, workers=SENTIMENT_WORKERS):
     sentiments = {"Positive": 0, "Negative": 0, "Neutral": 0}
-    for msg in messages:
-        if "<Media omitted>" in str(msg):
-            continue
-
-        polarity = TextBlob(str(msg)).sentiment.polarity
-        if polarity > 0.1:
-            sentiments["Positive"] += 1
-        elif polarity < -0.1:
-            sentiments["Negative"] += 1
-        else:
-            sentiments["Neutral"] += 1
+    counts = Counter(str(msg) for msg in messages)
+    counts = {msg: n for msg, n in counts.items() if "<Media omitted>" not in msg}
+
+    polarities = get_polarities(list(counts), workers)
+    for msg, n in counts.items():
+        sentiments[_sentiment_label(polarities[msg])] += n
     return sentiments
 
 
-# Toxicity & Spam Detection Logic
-def get_toxicity_spam_report(messages):
-    spam_keywords = [
-        "free offer", "click here", "subscribe now", "win cash", "greatest deal", "promo code", "limited time",
-        "guaranteed money", "call now", "urgent news", "buy now", "order today", "exclusive deal", "act fast",
-        "special promotion", "hot offer", "don’t miss out", "best price", "lowest cost", "instant savings", "act now",
-        "today only", "shop now", "get yours now", "clearance sale", "earn money", "make cash fast",
-        "double your income", "easy money", "no investment required", "financial freedom", "get rich quick",
-        "work from home", "save big", "massive discount", "big savings", "lowest rates", "extra income", "free gift",
-        "bonus offer", "cash bonus", "claim your reward", "free trial", "complimentary access", "instant access",
-        "join free", "claim now", "gift inside", "act immediately", "hurry up", "limited stock", "expires soon",
-        "final notice", "last chance", "time running out", "immediate action required", "don’t delay",
-        "offer ends tonight", "only a few left", "click below", "click this link", "check this out",
-        "visit our website", "learn more now", "go here", "see for yourself", "get started now", "tap to claim",
-        "download instantly", "miracle solution", "secret revealed", "100% success", "risk-free", "no strings attached",
-        "unbelievable results", "guaranteed win", "once-in-a-lifetime offer", "proven system", "win big today",
-        "online biz opportunity", "be your own boss", "start earning today", "no experience required", "signup bonus",
-        "instant approval", "one-click access", "unlimited bandwidth", "easy registration", "Limited time offer",
-        "offer deal", "diwali offer", "Great deal", "Deal offer", "Money back"
-    ]
-    toxic_keywords = [
-        "idiot", "stupid", "dumb", "hate you", "shame", "worst", "loser", "ugly", "nonsense", "fool", "disgusting",
-        "worthless", "trash", "pathetic", "moron", "annoying", "useless", "arrogant", "horrible", "crazy", "lazy",
-        "jerk", "selfish", "nasty", "embarrassing", "terrible", "ridiculous", "toxic", "liar", "coward", "creep",
-        "disgrace", "failure", "awful", "stupidhead", "dumbass", "fake", "cringe", "hopeless", "unwanted",
-        "ignorant", "boring", "gross", "mean", "bad", "brainless", "nobody", "weak", "evil", "backstabber",
-        "two-faced", "jealous", "crybaby", "clown", "drama queen", "lunatic", "cheap", "disrespectful",
-        "crazy person", "bad attitude", "narrow-minded", "heartless", "cold", "bitter", "immature", "greedy",
-        "rude", "dumb move", "stupid act", "worthless person", "horrid", "dirty", "ungrateful", "negative",
-        "fake friend", "toxic person", "psycho", "sick mind", "trash talker", "backstabber", "unpleasant",
-        "attention seeker", "overacting", "manipulative", "idiotic", "moronic", "shameless", "noob",
-        "slow", "silly", "lame", "twisted", "hateful", "disgusted", "horrendous", "filthy",
-        "nasty mind", "trash human", "bully", "obnoxious", "narcissist", "vile", "mean-spirited", "backstabber",
-        "snake", "devil", "cowardly", "sarcastic", "hypocrite", "two-timer", "disloyal", "ignoramus",
-        "lowlife", "dirtbag", "blockhead", "nitwit", "airhead", "chatterbox", "untrustworthy", "idiocracy",
-        "dimwit", "pessimist", "hater", "blameworthy", "spoiled", "cold-hearted", "stone-hearted", "miserable",
-        "maniac", "temperamental", "attention seeker", "crybaby", "complainer", "argumentative",
-        "toxic soul", "broke-minded", "lousy", "problematic", "narrow-souled", "fake heart",
-        "manipulator", "gaslighter", "schemer", "overdramatic", "immoral", "insensitive",
-        "backstabber", "disloyal person", "unethical", "insolent", "ruthless", "domineering", "vindictive",
-        "mean-minded", "obnoxious brat", "low mentality", "negative thinker", "unfriendly", "hostile", "spiteful",
-        "troublemaker", "unfair", "unreliable", "irrational", "argument maker", "egoistic", "show-off",
-        "attention hungry", "fake smile", "self-centered", "boastful", "judgmental", "irritating", "narrow-hearted",
-        "uncivilized", "reckless", "harsh", "bullying", "complaint box", "twisted soul", "arrogant fool",
-        "immoral person", "unpleasant mind", "venomous", "offensive", "dumb-minded", "rude soul", "negative vibe",
-        "non-sense maker", "villain", "maniac thinker", "rotten", "filthy mind", "dark-hearted", "draining person",
-        "malicious", "insulting", "rough-tongued", "argument lover", "toxic thinker", "bad-mouthed"
-    ]
+def sentiment_labels(messages, workers=SENTIMENT_WORKERS):
+    messages = [str(msg) for msg in messages]
+    polarities = get_polarities([msg for msg in set(messages) if "<Media omitted>" not in msg], workers)
+    labels = {msg: _sentiment_label(polarity) for msg, polarity in polarities.items()}
+    return [labels.get(msg) for msg in messages]
 
-    report = {"Spam/Promo": 0, "Toxic/Rude": 0, "Clean": 0}
 
+# Toxicity & Spam Detection Logic
+SPAM_KEYWORDS = [
+    "free offer", "click here", "subscribe now", "win cash", "greatest deal", "promo code", "limited time",
+    "guaranteed money", "call now", "urgent news", "buy now", "order today", "exclusive deal", "act fast",
+    "special promotion", "hot offer", "don’t miss out", "best price", "lowest cost", "instant savings", "act now",
+    "today only", "shop now", "get yours now", "clearance sale", "earn money", "make cash fast",
+    "double your income", "easy money", "no investment required", "financial freedom", "get rich quick",
+    "work from home", "save big", "massive discount", "big savings", "lowest rates", "extra income", "free gift",
+    "bonus offer", "cash bonus", "claim your reward", "free trial", "complimentary access", "instant access",
+    "join free", "claim now", "gift inside", "act immediately", "hurry up", "limited stock", "expires soon",
+    "final notice", "last chance", "time running out", "immediate action required", "don’t delay",
+    "offer ends tonight", "only a few left", "click below", "click this link", "check this out",
+    "visit our website", "learn more now", "go here", "see for yourself", "get started now", "tap to claim",
+    "download instantly", "miracle solution", "secret revealed", "100% success", "risk-free", "no strings attached",
+    "unbelievable results", "guaranteed win", "once-in-a-lifetime offer", "proven system", "win big today",
+    "online biz opportunity", "be your own boss", "start earning today", "no experience required", "signup bonus",
+    "instant approval", "one-click access", "unlimited bandwidth", "easy registration", "Limited time offer",
+    "offer deal", "diwali offer", "Great deal", "Deal offer", "Money back"
+]
+TOXIC_KEYWORDS = [
+    "idiot", "stupid", "dumb", "hate you", "shame", "worst", "loser", "ugly", "nonsense", "fool", "disgusting",
+    "worthless", "trash", "pathetic", "moron", "annoying", "useless", "arrogant", "horrible", "crazy", "lazy",
+    "jerk", "selfish", "nasty", "embarrassing", "terrible", "ridiculous", "toxic", "liar", "coward", "creep",
+    "disgrace", "failure", "awful", "stupidhead", "dumbass", "fake", "cringe", "hopeless", "unwanted",
+    "ignorant", "boring", "gross", "mean", "bad", "brainless", "nobody", "weak", "evil", "backstabber",
+    "two-faced", "jealous", "crybaby", "clown", "drama queen", "lunatic", "cheap", "disrespectful",
+    "crazy person", "bad attitude", "narrow-minded", "heartless", "cold", "bitter", "immature", "greedy",
+    "rude", "dumb move", "stupid act", "worthless person", "horrid", "dirty", "ungrateful", "negative",
+    "fake friend", "toxic person", "psycho", "sick mind", "trash talker", "backstabber", "unpleasant",
+    "attention seeker", "overacting", "manipulative", "idiotic", "moronic", "shameless", "noob",
+    "slow", "silly", "lame", "twisted", "hateful", "disgusted", "horrendous", "filthy",
+    "nasty mind", "trash human", "bully", "obnoxious", "narcissist", "vile", "mean-spirited", "backstabber",
+    "snake", "devil", "cowardly", "sarcastic", "hypocrite", "two-timer", "disloyal", "ignoramus",
+    "lowlife", "dirtbag", "blockhead", "nitwit", "airhead", "chatterbox", "untrustworthy", "idiocracy",
+    "dimwit", "pessimist", "hater", "blameworthy", "spoiled", "cold-hearted", "stone-hearted", "miserable",
+    "maniac", "temperamental", "attention seeker", "crybaby", "complainer", "argumentative",
+    "toxic soul", "broke-minded", "lousy", "problematic", "narrow-souled", "fake heart",
+    "manipulator", "gaslighter", "schemer", "overdramatic", "immoral", "insensitive",
+    "backstabber", "disloyal person", "unethical", "insolent", "ruthless", "domineering", "vindictive",
+    "mean-minded", "obnoxious brat", "low mentality", "negative thinker", "unfriendly", "hostile", "spiteful",
+    "troublemaker", "unfair", "unreliable", "irrational", "argument maker", "egoistic", "show-off",
+    "attention hungry", "fake smile", "self-centered", "boastful", "judgmental", "irritating", "narrow-hearted",
+    "uncivilized", "reckless", "harsh", "bullying", "complaint box", "twisted soul", "arrogant fool",
+    "immoral person", "unpleasant mind", "venomous", "offensive", "dumb-minded", "rude soul", "negative vibe",
+    "non-sense maker", "villain", "maniac thinker", "rotten", "filthy mind", "dark-hearted", "draining person",
+    "malicious", "insulting", "rough-tongued", "argument lover", "toxic thinker", "bad-mouthed"
+]
+
+
+def load_keywords(path):
+    # Messages are lowercased before matching, so phrases are too.
+    with open(path, encoding="utf-8") as f:
+        return [line.strip().lower() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+# Keyword files (one phrase per line, # for comments) named by these variables replace the
+# built-in lists.
+if os.environ.get("ANALYZER_SPAM_KEYWORDS"):
+    SPAM_KEYWORDS = load_keywords(os.environ["ANALYZER_SPAM_KEYWORDS"])
+if os.environ.get("ANALYZER_TOXIC_KEYWORDS"):
+    TOXIC_KEYWORDS = load_keywords(os.environ["ANALYZER_TOXIC_KEYWORDS"])
+
+# Cached tallies were classified with the lists in effect, so they are keyed on them.
+KEYWORDS_DIGEST = hashlib.sha256("\n".join(SPAM_KEYWORDS + ["\0"] + TOXIC_KEYWORDS).encode("utf-8")).hexdigest()[:16]
+
+
+def _trie_regex(words):
+    # Factor shared prefixes so the regex engine walks a trie instead of retrying
+    # every alternative at each position.
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        if list(node) == [""]:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if optional else group
+
+    return build(trie)
+
+
+@functools.lru_cache(maxsize=16)
+def compile_keywords(keywords, word_boundaries=False):
+    if not keywords:
+        # An empty alternation would match everything; an empty list matches nothing.
+        return re.compile(r"(?!)")
+    pattern = _trie_regex(keywords)
+    if word_boundaries:
+        pattern = r"(?<!\w)" + pattern + r"(?!\w)"
+    return re.compile(pattern)
+
+
+def toxicity_labels(messages, spam_keywords=SPAM_KEYWORDS, toxic_keywords=TOXIC_KEYWORDS,
+                    word_boundaries=False):
+    spam_matcher = compile_keywords(tuple(spam_keywords), word_boundaries)
+    toxic_matcher = compile_keywords(tuple(toxic_keywords), word_boundaries)
+
+    labels = []
     for msg in messages:
         message = str(msg).lower()
         if "<media omitted>" in message:
-            continue
+            labels.append(None)
+        elif toxic_matcher.search(message):
+            labels.append("Toxic/Rude")
+        elif spam_matcher.search(message):
+            labels.append("Spam/Promo")
+        else:
+            labels.append("Clean")
+    return labels
 
-        is_spam = any(k in message for k in spam_keywords)
-        is_toxic = any(k in message for k in toxic_keywords)
 
-        if is_spam and is_toxic:
-            report["Toxic/Rude"] += 1
-        elif is_toxic:
-            report["Toxic/Rude"] += 1
-        elif is_spam:
-            report["Spam/Promo"] += 1
-        else:
-            report["Clean"] += 1
+def get_toxicity_spam_report(messages, spam_keywords=SPAM_KEYWORDS, toxic_keywords=TOXIC_KEYWORDS,
+                             word_boundaries=False):
+    report = {"Spam/Promo": 0, "Toxic/Rude": 0, "Clean": 0}
+
+    for label in toxicity_labels(messages, spam_keywords, toxic_keywords, word_boundaries):
+        if label is not None:
+            report[label] += 1
 
     return report
 
 
+SENTIMENT_LABELS = ["Positive", "Negative", "Neutral"]
+REPORT_LABELS = ["Spam/Promo", "Toxic/Rude", "Clean"]
+
+
+# Per-user sentiment and toxicity/spam counts. Kept alongside the parsed chat so switching
+# users is a row lookup and a re-ingested tail only needs its own messages classified.
+def build_message_tallies(df, workers=SENTIMENT_WORKERS):
+    labels = pd.DataFrame({
+        'User': df['User'].to_numpy(),
+        'Sentiment': sentiment_labels(df['Message'], workers),
+        'Report': toxicity_labels(df['Message']),
+    })
+    users = pd.Index(pd.unique(labels['User']), name='User')
+    sentiment = labels.groupby(['User', 'Sentiment']).size().unstack(fill_value=0)
+    report = labels.groupby(['User', 'Report']).size().unstack(fill_value=0)
+    tallies = pd.concat([
+        sentiment.reindex(index=users, columns=SENTIMENT_LABELS, fill_value=0),
+        report.reindex(index=users, columns=REPORT_LABELS, fill_value=0),
+    ], axis=1)
+    tallies.columns.name = None
+    return tallies.astype('int64')
+
+
+def merge_tallies(tallies, new_tallies):
+    return tallies.add(new_tallies, fill_value=0).astype('int64')
+
+
+def tallies_for_user(tallies, selected_user="Overall Chat"):
+    if selected_user == "Overall Chat":
+        row = tallies.sum()
+    else:
+        row = tallies.reindex([selected_user], fill_value=0).iloc[0]
+    sentiments = {label: int(row[label]) for label in SENTIMENT_LABELS}
+    report = {label: int(row[label]) for label in REPORT_LABELS}
+    return sentiments, report
+
+
+# Row positions by time. The chat frame is kept sorted on Date-Time, so any user x time
+# window resolves to a searchsorted range instead of a scan over every row.
+def build_time_index(df):
+    timestamps = df['Date-Time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    positions = df.groupby('User', observed=True, sort=False).indices
+    return {
+        "timestamps": timestamps,
+        "users": {user: (rows, timestamps[rows]) for user, rows in positions.items()},
+    }
+
+
+def _window_bounds(timestamps, start, end):
+    lo = 0 if start is None else np.searchsorted(timestamps, pd.Timestamp(start).value, side='left')
+    hi = len(timestamps) if end is None else np.searchsorted(timestamps, pd.Timestamp(end).value, side='left')
+    return lo, hi
+
+
+def slice_window(df, time_index, selected_user="Overall Chat", start=None, end=None):
+    # start is inclusive and end exclusive; None leaves that side open.
+    if selected_user == "Overall Chat":
+        lo, hi = _window_bounds(time_index["timestamps"], start, end)
+        return df.iloc[lo:hi]
+    if selected_user not in time_index["users"]:
+        return df.iloc[:0]
+    rows, timestamps = time_index["users"][selected_user]
+    lo, hi = _window_bounds(timestamps, start, end)
+    return df.iloc[rows[lo:hi]]
+
+
 def get_top_users(df):
     return df['User'].value_counts().nlargest(10)
 
 
 def analyze_active_days(df):
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
-                  'Friday', 'Saturday', 'Sunday']
-    day_counts = df['day'].value_counts().reindex(days_order, fill_value=0)
+    day_counts = df['day'].value_counts().reindex(DAYS_ORDER, fill_value=0)
     return day_counts
 
 
-def create_daily_messages_bar_chart(df, styler):
-    daily_counts = analyze_active_days(df).reset_index()
+# Activity cube: message counts per user x calendar date x hour. Built once per upload;
+# every time-based chart below sums a slice of it instead of rescanning the messages.
+def build_activity_cube(df):
+    cube = df.groupby([df['User'], df['Date-Time'].dt.normalize().rename('date'), df['hour']],
+                      observed=True).size().reset_index(name='Count')
+    return cube
+
+
+def merge_activity_cubes(cube, new_cube):
+    merged = pd.concat([cube, new_cube], ignore_index=True)
+    return merged.groupby(['User', 'date', 'hour'], observed=True)['Count'].sum().reset_index()
+
+
+def activity_for_user(cube, selected_user="Overall Chat", start=None, end=None):
+    if start is not None or end is not None:
+        in_window = pd.Series(True, index=cube.index)
+        if start is not None:
+            in_window &= cube['date'] >= pd.Timestamp(start)
+        if end is not None:
+            in_window &= cube['date'] < pd.Timestamp(end)
+        cube = cube[in_window]
+    if selected_user == "Overall Chat":
+        return cube.groupby(['date', 'hour'], observed=True)['Count'].sum().reset_index()
+    return cube.loc[cube['User'] == selected_user, ['date', 'hour', 'Count']].reset_index(drop=True)
+
+
+# Timeline granularities from finest to coarsest: (resample rule, name, typical days per point).
+TIMELINE_FREQUENCIES = [("D", "Day", 1), ("W-MON", "Week", 7), ("MS", "Month", 30.44)]
+TIMELINE_MAX_POINTS = 150
+
+
+def _daily_totals(activity):
+    daily = activity.groupby('date')['Count'].sum().sort_index()
+    return daily.resample('D').sum()
+
+
+def choose_timeline_frequency(start, end, max_points=TIMELINE_MAX_POINTS):
+    span_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for rule, name, days in TIMELINE_FREQUENCIES:
+        if span_days / days <= max_points:
+            return rule, name
+    return TIMELINE_FREQUENCIES[-1][:2]
+
+
+def resample_timeline(activity, max_points=TIMELINE_MAX_POINTS):
+    # Finest granularity whose point count fits the budget; empty gaps become zeros.
+    daily = _daily_totals(activity)
+    if daily.empty:
+        return pd.DataFrame({'Date': pd.to_datetime([]), 'Count': []}), "Day"
+    rule, name = choose_timeline_frequency(daily.index[0], daily.index[-1], max_points)
+    totals = daily if rule == "D" else daily.resample(rule, label='left', closed='left').sum()
+    return pd.DataFrame({'Date': totals.index, 'Count': totals.to_numpy()}), name
+
+
+def create_daily_messages_bar_chart(activity, styler):
+    daily_counts = activity.groupby(activity['date'].dt.day_name())['Count'].sum()
+    daily_counts = daily_counts.reindex(DAYS_ORDER, fill_value=0).reset_index()
     daily_counts.columns = ['Day', 'Messages']
 
     fig = px.bar(daily_counts, x='Day', y='Messages',
@@ -228,10 +509,8 @@ def create_daily_messages_bar_chart(df, styler):
     return fig
 
 
-def create_monthly_day_count_chart(df, styler):
-    df['day_of_month'] = df['Date-Time'].dt.day
-
-    day_counts = df['day_of_month'].value_counts().sort_index().reset_index()
+def create_monthly_day_count_chart(activity, styler):
+    day_counts = activity.groupby(activity['date'].dt.day)['Count'].sum().sort_index().reset_index()
     day_counts.columns = ['Day', 'Messages']
 
     fig = px.bar(day_counts, x='Day', y='Messages',
@@ -245,10 +524,8 @@ def create_monthly_day_count_chart(df, styler):
     return fig
 
 
-def create_monthly_message_count_chart(df, styler):
-    df['month_num'] = df['Date-Time'].dt.month
-
-    month_counts = df.groupby('month_num').size().reset_index(name='Messages')
+def create_monthly_message_count_chart(activity, styler):
+    month_counts = activity.groupby(activity['date'].dt.month)['Count'].sum().reset_index()
     month_counts.columns = ['Month', 'Messages']
 
     fig = px.bar(month_counts, x='Month', y='Messages',
@@ -262,6 +539,20 @@ def create_monthly_message_count_chart(df, styler):
     return fig
 
 
+def create_search_hits_chart(hits_by_month, styler):
+    if hits_by_month.empty:
+        return None
+
+    fig = px.bar(hits_by_month, x='Month', y='Hits',
+                 color='Hits',
+                 color_continuous_scale=[styler.current_theme["grid"], styler.current_theme["primary"]],
+                 title='Matching Messages per Month')
+
+    fig = styler.style_graph(fig, 'Month', 'Matching Messages')
+    fig.update_traces(marker_line_width=0, opacity=0.9)
+    return fig
+
+
 def create_top_users_bar_chart(df, styler):
     top_users_data = get_top_users(df).reset_index()
     top_users_data.columns = ['User', 'Messages']
@@ -276,79 +567,167 @@ def create_top_users_bar_chart(df, styler):
     return fig
 
 
-def create_wordcloud(messages):
-    text = " ".join([str(msg) for msg in messages])
-    stop_words = set(STOPWORDS)
-    stop_words.update(
-        ["media", "omitted", "Media", "omit", "message", "de", "to", "la", "you", "is", "a", "an", "the", "in", "it"])
+EMOJI_TOP_N = 20
+_EMOJI_MARK = "\x00"
+
+
+@functools.lru_cache(maxsize=1)
+def emoji_pattern():
+    # Every emoji the emoji package knows, as one trie-shaped alternation. Longer sequences
+    # (skin tones, ZWJ families, flags) win over their single-codepoint prefixes.
+    return "(" + _trie_regex(emoji.EMOJI_DATA) + ")"
+
+
+def extract_emojis(messages):
+    # Wraps each emoji in marker characters with a single regex pass over the whole column,
+    # then splits on the markers: the odd pieces of every message are its emojis.
+    # Returns (row position, emoji) arrays.
+    texts = pc.replace_substring(pa.array(messages, type=pa.string()), _EMOJI_MARK, "")
+    pieces = pc.split_pattern(pc.replace_substring_regex(texts, emoji_pattern(), f"{_EMOJI_MARK}\\1{_EMOJI_MARK}"),
+                              _EMOJI_MARK)
+    if isinstance(pieces, pa.ChunkedArray):
+        pieces = pieces.combine_chunks()
+    rows = pc.list_parent_indices(pieces).to_numpy()
+    offsets = pieces.offsets.to_numpy()
+    is_emoji = (np.arange(offsets[0], offsets[0] + len(rows)) - offsets[rows]) % 2 == 1
+    return rows[is_emoji], pc.list_flatten(pieces).to_numpy(zero_copy_only=False)[is_emoji]
+
+
+def build_emoji_stats(df):
+    rows, emojis = extract_emojis(df['Message'])
+    users = df['User'].to_numpy()
+    counts = pd.DataFrame({'User': users[rows], 'Emoji': emojis}).value_counts().rename('Count').reset_index()
+    messages = pd.Series(users).value_counts().rename('Messages')
+    return counts, messages
+
+
+def emoji_summary(emoji_stats, selected_user="Overall Chat", top_n=EMOJI_TOP_N):
+    counts, messages = emoji_stats
+    if selected_user != "Overall Chat":
+        counts = counts[counts['User'] == selected_user]
+        total_messages = int(messages.get(selected_user, 0))
+    else:
+        total_messages = int(messages.sum())
+    top = counts.groupby('Emoji')['Count'].sum().nlargest(top_n)
+    total_emojis = int(counts['Count'].sum())
+    per_message = total_emojis / total_messages if total_messages else 0.0
+    return top, total_emojis, per_message
+
+
+WORDCLOUD_STOPWORDS = set(STOPWORDS) | {
+    "media", "omitted", "omit", "message", "de", "to", "la", "you", "is", "a", "an", "the", "in", "it"}
+# Same token shape WordCloud uses internally: two or more word characters, apostrophes allowed.
+WORD_PATTERN = r"\w[\w']+"
+MAX_VOCABULARY = 2_000
+# Running counts are cut back to this many times max_words after every chunk.
+VOCABULARY_SLACK = 5
+WORDCLOUD_CHUNK_SIZE = 200_000
+
+
+def get_word_frequencies(messages, max_words=MAX_VOCABULARY, chunk_size=WORDCLOUD_CHUNK_SIZE):
+    messages = pd.Series(messages, dtype=object) if not isinstance(messages, pd.Series) else messages
+    messages = messages[~messages.str.contains(MEDIA_PLACEHOLDER, regex=False)]
+
+    # Peak memory is bounded by one chunk's vocabulary plus the pruned running counts. Words
+    # that never make the cut within a chunk can be undercounted, so the tail is approximate.
+    counts = pd.Series(dtype='int64')
+    for start in range(0, len(messages), chunk_size):
+        tokens = messages.iloc[start:start + chunk_size].str.lower().str.findall(WORD_PATTERN).explode().dropna()
+        tokens = tokens.str.replace(r"'s$", "", regex=True)
+        chunk_counts = tokens.value_counts()
+        words = chunk_counts.index.to_series()
+        chunk_counts = chunk_counts[~words.isin(WORDCLOUD_STOPWORDS) & ~words.str.isdigit()]
+        counts = counts.add(chunk_counts, fill_value=0).nlargest(max_words * VOCABULARY_SLACK)
+
+    return counts.nlargest(max_words).astype('int64')
+
+
+def create_wordcloud(frequencies):
+    if len(frequencies) == 0:
+        return None
 
     wc = WordCloud(width=800, height=400,
                    background_color='white',
-                   stopwords=stop_words,
                    min_font_size=10)
 
-    wc.generate(text)
-
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wc, interpolation='bilinear')
-    plt.axis("off")
+    wc.generate_from_frequencies(dict(frequencies))
 
     img_buf = io.BytesIO()
-    plt.savefig(img_buf, format='png', bbox_inches='tight', pad_inches=0)
+    wc.to_image().save(img_buf, format='png')
     img_buf.seek(0)
-    plt.close()
     return img_buf
 
 
-def create_monthly_timeline(df, styler):
-    timeline = df.groupby(['year', 'month']).size().reset_index(name='Count')
-
-    timeline['Date'] = pd.to_datetime(timeline['month'] + ' ' + timeline['year'].astype(str), format='%B %Y')
-    timeline = timeline.sort_values('Date')
-    timeline['Label'] = timeline['month'] + ' ' + timeline['year'].astype(str)
+def create_monthly_timeline(activity, styler):
+    timeline, period = resample_timeline(activity)
 
-    fig = px.line(timeline, x='Label', y='Count', text='Count',
-                  title='Monthly Message Activity (Line Plot)',
+    fig = px.line(timeline, x='Date', y='Count',
+                  text='Count' if period == "Month" else None,
+                  title=f'Message Activity per {period} (Line Plot)',
                   line_shape='spline')
 
-    fig.update_traces(line_color=styler.current_theme["primary"], line_width=4, mode='lines+markers',
-                      marker=dict(size=8, color=styler.current_theme["text"]))
+    fig.update_traces(line_color=styler.current_theme["primary"], line_width=4,
+                      mode='lines+markers+text' if period == "Month" else 'lines+markers',
+                      marker=dict(size=8 if period == "Month" else 4, color=styler.current_theme["text"]))
 
-    fig = styler.style_graph(fig, 'Month and Year', 'Message Count')
+    fig = styler.style_graph(fig, period, 'Message Count')
 
     fig.update_xaxes(tickangle=45, nticks=10)
     return fig
 
 
-def create_monthly_area_timeline(df, styler):
-    timeline = df.groupby(['year', 'month']).size().reset_index(name='Count')
-
-    timeline['Date'] = pd.to_datetime(timeline['month'] + ' ' + timeline['year'].astype(str), format='%B %Y')
-    timeline = timeline.sort_values('Date')
-    timeline['Label'] = timeline['month'] + ' ' + timeline['year'].astype(str)
+def create_monthly_area_timeline(activity, styler):
+    timeline, period = resample_timeline(activity)
 
-    fig = px.area(timeline, x='Label', y='Count',
-                  title='Monthly Message Activity (Area Plot)',
+    fig = px.area(timeline, x='Date', y='Count',
+                  title=f'Message Activity per {period} (Area Plot)',
                   line_shape='spline')
 
     fig.update_traces(fillcolor=styler.current_theme["primary"],
                       line=dict(color=styler.current_theme["primary"], width=2), opacity=0.7)
 
-    fig = styler.style_graph(fig, 'Month and Year', 'Message Count')
+    fig = styler.style_graph(fig, period, 'Message Count')
 
     fig.update_xaxes(tickangle=45, nticks=10)
     return fig
 
 
-def create_daily_activity_map(df, styler):
-    activity = df.groupby(['day', 'hour']).size().reset_index(name='Count')
+def create_daily_timeline(activity, styler):
+    # Every day of the chat in one WebGL trace; the range slider and buttons let long chats
+    # be zoomed on the client without another rerun.
+    daily = _daily_totals(activity)
+
+    fig = go.Figure(go.Scattergl(
+        x=daily.index, y=daily.to_numpy(), mode='lines',
+        line=dict(color=styler.current_theme["primary"], width=1.5),
+        hovertemplate='%{x|%d %b %Y}<br>%{y} messages<extra></extra>'))
+
+    fig.update_layout(title='Daily Message Activity')
+    fig = styler.style_graph(fig, 'Date', 'Message Count')
+
+    fig.update_xaxes(
+        rangeslider=dict(visible=True, bgcolor=styler.current_theme["bg"]),
+        rangeselector=dict(
+            buttons=[
+                dict(count=1, label="1m", step="month", stepmode="backward"),
+                dict(count=6, label="6m", step="month", stepmode="backward"),
+                dict(count=1, label="1y", step="year", stepmode="backward"),
+                dict(step="all", label="All"),
+            ],
+            bgcolor=styler.current_theme["grid"],
+            font=dict(color=styler.current_theme["text"]),
+        ),
+    )
+    return fig
+
+
+def create_daily_activity_map(activity, styler):
+    activity = activity.groupby([activity['date'].dt.day_name().rename('day'), 'hour'])['Count'].sum()
 
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
-                  'Friday', 'Saturday', 'Sunday']
     hours_order = list(range(24))
 
-    full_index = pd.MultiIndex.from_product([days_order, hours_order], names=['day', 'hour'])
-    activity = activity.set_index(['day', 'hour']).reindex(full_index, fill_value=0).reset_index()
+    full_index = pd.MultiIndex.from_product([DAYS_ORDER, hours_order], names=['day', 'hour'])
+    activity = activity.reindex(full_index, fill_value=0).reset_index()
 
     fig = px.density_heatmap(activity,
                              x='hour',
@@ -395,42 +774,299 @@ def create_toxicity_spam_chart(report_data, styler):
     return fig
 
 
-def create_reply_time_analysis(df, styler):
-    top_10_users = get_top_users(df).index.tolist()
-    filtered_df = df[df['User'].isin(top_10_users)].copy()
+# Gaps longer than this are treated as a new conversation rather than a slow reply.
+REPLY_TIME_CAP_MINUTES = 12 * 60
+REPLY_CHART_MAX_USERS = 25
+REPLY_QUANTILES = {"median_minutes": 0.5, "p90_minutes": 0.9}
+
+
+def _group_quantiles(values, groups, n_groups, q):
+    # values must be sorted within each group and groups sorted ascending.
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    result = np.full(n_groups, np.nan)
+    present = counts > 0
+    position = starts[present] + q * (counts[present] - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    result[present] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+def _by_chat(df, *columns):
+    # Frames combined from several chats carry a 'chat' column. Rows are regrouped chat by
+    # chat (keeping time order inside each) so neighbouring rows never span two chats;
+    # the returned mask marks rows that start a new chat.
+    if 'chat' not in df:
+        return columns, np.zeros(len(df), dtype=bool)
+    chat = df['chat'].to_numpy()
+    order = np.argsort(chat, kind='stable')
+    chat = chat[order]
+    starts = np.ones(len(chat), dtype=bool)
+    starts[1:] = chat[1:] != chat[:-1]
+    return [column[order] for column in columns], starts
+
+
+def _reply_pairs(df, cap_minutes):
+    # Returns (user categories, replier codes, replied-to codes, latency in minutes), or None
+    # when fewer than two users wrote anything.
+    users = df['User'] if isinstance(df['User'].dtype, pd.CategoricalDtype) else df['User'].astype('category')
+    if users.nunique() < 2:
+        return None
+
+    (codes, timestamps), chat_starts = _by_chat(
+        df, users.cat.codes.to_numpy(), df['Date-Time'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+
+    # A reply is any message whose previous message came from someone else in the same chat.
+    is_reply = (codes[1:] != codes[:-1]) & (codes[1:] >= 0) & (codes[:-1] >= 0) & ~chat_starts[1:]
+    latency = (timestamps[1:] - timestamps[:-1]) / 60e9
+    valid = (is_reply & (timestamps[1:] != np.iinfo(np.int64).min)
+             & (timestamps[:-1] != np.iinfo(np.int64).min) & (latency >= 0))
+    if cap_minutes is not None:
+        valid &= latency <= cap_minutes
+    return users.cat.categories, codes[1:][valid], codes[:-1][valid], latency[valid]
 
-    if filtered_df['User'].nunique() < 2:
+
+def get_reply_times(df, cap_minutes=REPLY_TIME_CAP_MINUTES):
+    pairs = _reply_pairs(df, cap_minutes)
+    if pairs is None:
         return None
 
-    filtered_df['Time_Diff'] = filtered_df['Date-Time'].diff()
-    filtered_df['Prev_User'] = filtered_df['User'].shift(1)
+    categories, repliers, _, latency = pairs
+    order = np.lexsort((latency, repliers))
+    repliers, latency = repliers[order], latency[order]
 
-    reply_df = filtered_df[
-        (filtered_df['User'] != filtered_df['Prev_User']) & (filtered_df['Prev_User'].notna())].copy()
+    n_users = len(categories)
+    stats = pd.DataFrame(
+        {name: _group_quantiles(latency, repliers, n_users, q) for name, q in REPLY_QUANTILES.items()},
+        index=pd.Index(categories, name='User'))
+    stats['replies'] = np.bincount(repliers, minlength=n_users)
+    return stats[stats['replies'] > 0].sort_values('replies', ascending=False)
 
-    reply_time_minutes = reply_df.groupby('User')['Time_Diff'].mean().dt.total_seconds() / 60
 
-    reply_data = reply_time_minutes.reset_index(name='Avg_Reply_Time_Minutes')
-    reply_data['Avg_Reply_Time'] = reply_data['Avg_Reply_Time_Minutes'].apply(
-        lambda x: f"{int(x // 60)}h {int(x % 60)}m")
+INTERACTION_MAX_USERS = 30
+INTERACTION_WEIGHTS = {"Replies": "Replies", "median_minutes": "Median Reply (min)"}
 
-    reply_data['User'] = reply_data['User'].astype(str)
 
-    fig = px.bar(reply_data, x='User', y='Avg_Reply_Time_Minutes',
-                 text='Avg_Reply_Time',
-                 color='Avg_Reply_Time_Minutes',
-                 color_continuous_scale=[styler.current_theme["grid"], styler.current_theme["primary"]],
-                 title='Average Reply Time (Lower is Faster) for Top 10 Active Users')
+def build_interactions(df, cap_minutes=REPLY_TIME_CAP_MINUTES):
+    # Sparse who-replies-to-whom matrix as an edge list: one row per (From, To) pair that
+    # actually occurs, so memory follows the number of conversations, not users squared.
+    pairs = _reply_pairs(df, cap_minutes)
+    if pairs is None:
+        return None
+
+    categories, repliers, targets, latency = pairs
+    keys = repliers.astype(np.int64) * len(categories) + targets
+    order = np.lexsort((latency, keys))
+    keys, latency = keys[order], latency[order]
+
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    edge_ids = np.cumsum(first) - 1
+    edge_keys = keys[first]
+    senders, receivers = np.divmod(edge_keys, len(categories))
+
+    interactions = pd.DataFrame({
+        'From': pd.Categorical.from_codes(senders.astype(repliers.dtype), categories),
+        'To': pd.Categorical.from_codes(receivers.astype(repliers.dtype), categories),
+        'Replies': np.bincount(edge_ids, minlength=len(edge_keys)),
+        'median_minutes': _group_quantiles(latency, edge_ids, len(edge_keys), 0.5),
+    })
+    return interactions.sort_values('Replies', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def _interaction_users(interactions, max_users):
+    volume = (interactions.groupby('From', observed=True)['Replies'].sum()
+              .add(interactions.groupby('To', observed=True)['Replies'].sum(), fill_value=0))
+    return volume.nlargest(max_users).index.astype(str)
+
+
+def user_interactions(interactions, selected_user, max_users=INTERACTION_MAX_USERS):
+    if interactions is None or interactions.empty:
+        return None
+    sent = interactions[interactions['From'] == selected_user].groupby('To', observed=True)['Replies'].sum()
+    received = interactions[interactions['To'] == selected_user].groupby('From', observed=True)['Replies'].sum()
+    partners = pd.DataFrame({'Replies Sent': sent, 'Replies Received': received}).fillna(0).astype(np.int64)
+    if partners.empty:
+        return None
+    partners.index = partners.index.astype(str).rename('Partner')
+    return partners.loc[partners.sum(axis=1).nlargest(max_users).index]
+
+
+def create_interaction_heatmap(interactions, styler, weight="Replies", max_users=INTERACTION_MAX_USERS):
+    if interactions is None or interactions.empty:
+        return None
+
+    # Only the busiest users are drawn; the dense grid is at most max_users squared.
+    top = _interaction_users(interactions, max_users)
+    edges = interactions.astype({'From': str, 'To': str})
+    edges = edges[edges['From'].isin(top) & edges['To'].isin(top)]
+    matrix = edges.pivot(index='From', columns='To', values=weight).reindex(index=top, columns=top)
+
+    label = INTERACTION_WEIGHTS[weight]
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(), x=list(top), y=list(top),
+        colorscale=[styler.current_theme["grid"], styler.current_theme["primary"]],
+        reversescale=weight != "Replies",
+        colorbar=dict(title=label),
+        hovertemplate='%{y} replying to %{x}<br>' + label + ': %{z:.0f}<extra></extra>'))
+
+    title = 'Who Replies to Whom' if weight == "Replies" else 'Reply Speed Between Users (Lower is Faster)'
+    fig.update_layout(title=title, height=max(450, 22 * len(top)))
+    fig = styler.style_graph(fig, 'Replying To', 'Reply From')
+    fig.update_xaxes(type='category', tickangle=45, showgrid=False)
+    fig.update_yaxes(type='category', autorange='reversed', showgrid=False)
+    return fig
+
 
-    fig = styler.style_graph(fig, 'User', 'Average Reply Time (Minutes)')
+def create_interaction_partners_chart(partners, styler):
+    if partners is None or partners.empty:
+        return None
+
+    partners = partners.iloc[::-1]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=partners.index, x=partners['Replies Sent'], name='Replied to them', orientation='h',
+        marker_color=styler.current_theme["primary"]))
+    fig.add_trace(go.Bar(
+        y=partners.index, x=partners['Replies Received'], name='They replied', orientation='h',
+        marker_color=styler.current_theme["grid"]))
+
+    fig.update_layout(title='Top Conversation Partners', barmode='group', height=max(400, 28 * len(partners)))
+    fig = styler.style_graph(fig, 'Replies', 'User')
+    fig.update_traces(marker_line_width=0, opacity=0.9)
+    fig.update_yaxes(type='category')
+    return fig
+
+
+SESSION_GAP_MINUTES = 60
+SESSION_CHART_MAX_USERS = 25
+SESSION_DURATION_BINS = [0, 5, 30, 120, 360, np.inf]
+SESSION_DURATION_LABELS = ['< 5 min', '5-30 min', '30 min - 2 h', '2-6 h', '6 h +']
+
+
+def build_sessions(df, gap_minutes=SESSION_GAP_MINUTES):
+    # A session ends wherever the chat goes quiet for longer than gap_minutes. Returns the
+    # session table (one row per session) and its members as unique (Session, User) pairs.
+    users = df['User'] if isinstance(df['User'].dtype, pd.CategoricalDtype) else df['User'].astype('category')
+    categories = users.cat.categories
+    timestamps = df['Date-Time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    chat = df['chat'].to_numpy() if 'chat' in df else np.zeros(len(df), dtype=np.int8)
+
+    valid = (users.cat.codes.to_numpy() >= 0) & (timestamps != np.iinfo(np.int64).min)
+    codes, timestamps, chat = users.cat.codes.to_numpy()[valid], timestamps[valid], chat[valid]
+    # Sessions never span two chats of a combined upload.
+    if len(timestamps) and (np.any(timestamps[1:] < timestamps[:-1]) or np.any(chat[1:] != chat[:-1])):
+        order = np.lexsort((timestamps, chat))
+        codes, timestamps, chat = codes[order], timestamps[order], chat[order]
+
+    n = len(timestamps)
+    new = np.ones(n, dtype=bool)
+    new[1:] = (np.diff(timestamps) > gap_minutes * 60e9) | (chat[1:] != chat[:-1])
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], n)[:len(starts)] - 1
+    session_ids = np.cumsum(new) - 1
+
+    # Consecutive messages from the same person add nothing to the member set, so only
+    # speaker changes go through the (much smaller) unique.
+    changes = new.copy()
+    changes[1:] |= codes[1:] != codes[:-1]
+    pairs = np.unique(session_ids[changes] * len(categories) + codes[changes])
+    member_sessions, member_codes = np.divmod(pairs, max(len(categories), 1))
+
+    sessions = pd.DataFrame({
+        'Start': timestamps[starts].astype('datetime64[ns]'),
+        'Duration': (timestamps[ends] - timestamps[starts]) / 60e9,
+        'Messages': np.diff(np.append(starts, n)),
+        'Participants': np.bincount(member_sessions, minlength=len(starts)),
+        'Initiator': pd.Categorical.from_codes(codes[starts], categories),
+    })
+    sessions.index.name = 'Session'
+    members = pd.DataFrame({
+        'Session': member_sessions,
+        'User': pd.Categorical.from_codes(member_codes.astype(codes.dtype), categories),
+    })
+    return sessions, members
+
+
+def user_sessions(session_table, selected_user="Overall Chat"):
+    sessions, members = session_table
+    if selected_user == "Overall Chat":
+        return sessions
+    return sessions.iloc[members.loc[members['User'] == selected_user, 'Session'].to_numpy()]
+
+
+def create_session_length_chart(sessions, styler):
+    if sessions is None or sessions.empty:
+        return None
+
+    buckets = pd.cut(sessions['Duration'], SESSION_DURATION_BINS, right=False, labels=SESSION_DURATION_LABELS)
+    grouped = sessions.groupby(buckets, observed=False)['Messages']
+    length_data = pd.DataFrame({'Sessions': grouped.size(), 'Median': grouped.median().fillna(0)})
+
+    fig = go.Figure(go.Bar(
+        x=length_data.index.astype(str), y=length_data['Sessions'],
+        marker_color=styler.current_theme["primary"],
+        customdata=length_data['Median'],
+        hovertemplate='%{x}<br>Sessions: %{y}<br>Median messages: %{customdata:.0f}<extra></extra>'))
+
+    fig.update_layout(title='Conversation Length')
+    fig = styler.style_graph(fig, 'Session Duration', 'Sessions')
+    fig.update_traces(marker_line_width=0, opacity=0.9)
+    fig.update_xaxes(type='category')
+    return fig
+
+
+def create_session_initiators_chart(sessions, styler):
+    if sessions is None or sessions.empty:
+        return None
+
+    started = sessions['Initiator'].value_counts().head(SESSION_CHART_MAX_USERS)
+    started = started[started > 0].sort_values()
+    share = started / len(sessions) * 100
+
+    fig = go.Figure(go.Bar(
+        x=started.to_numpy(), y=started.index.astype(str), orientation='h',
+        marker_color=styler.current_theme["primary"],
+        customdata=share.to_numpy(),
+        hovertemplate='%{y}<br>Started: %{x}<br>Share: %{customdata:.1f}%<extra></extra>'))
+
+    fig.update_layout(title='Who Starts Conversations', height=max(400, 22 * len(started)))
+    fig = styler.style_graph(fig, 'Sessions Started', 'User')
+    fig.update_traces(marker_line_width=0, opacity=0.9)
+    fig.update_yaxes(type='category')
+    return fig
+
+
+def _format_minutes(minutes):
+    return f"{int(minutes // 60)}h {int(minutes % 60)}m"
+
+
+def create_reply_time_analysis(reply_stats, styler):
+    if reply_stats is None or reply_stats.empty:
+        return None
+
+    reply_data = reply_stats.head(REPLY_CHART_MAX_USERS).sort_values('median_minutes').reset_index()
+    reply_data['User'] = reply_data['User'].astype(str)
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=reply_data['User'], y=reply_data['median_minutes'], name='Median',
+        text=reply_data['median_minutes'].apply(_format_minutes),
+        marker_color=styler.current_theme["primary"],
+        customdata=reply_data['replies'],
+        hovertemplate='%{x}<br>Median: %{text}<br>Replies: %{customdata}<extra></extra>'))
+    fig.add_trace(go.Bar(
+        x=reply_data['User'], y=reply_data['p90_minutes'], name='90th percentile',
+        text=reply_data['p90_minutes'].apply(_format_minutes),
+        marker_color=styler.current_theme["grid"],
+        hovertemplate='%{x}<br>P90: %{text}<extra></extra>'))
+
+    fig.update_layout(title='Reply Time per User (Lower is Faster)', barmode='group')
+    fig = styler.style_graph(fig, 'User', 'Reply Time (Minutes)')
     fig.update_traces(marker_line_width=0, opacity=0.9, textposition='outside')
 
-    fig.update_xaxes(
-        type='category',
-        tickangle=45,
-        tickformat='d',
-        categoryorder='total descending'
-    )
+    fig.update_xaxes(type='category', tickangle=45)
 
     fig.update_layout(uniformtext_minsize=12, uniformtext_mode='hide', yaxis_tickformat=".0f")
 
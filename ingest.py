@@ -0,0 +1,252 @@
+import codecs
+import functools
+import hashlib
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import chat_cache
+from preprocessor import preprocess, concat_frames, MESSAGE_START, PARSER_VERSION
+from helpers import build_activity_cube, build_message_tallies, merge_activity_cubes, merge_tallies, KEYWORDS_DIGEST
+
+FINGERPRINT_LINES = 20
+ENCODING_SNIFF_BYTES = 512
+
+_BLOCK_SIZE = 1 << 20
+
+_BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+
+def _file_type(uploaded_file):
+    return uploaded_file.name.split('.')[-1].lower()
+
+
+def _open_zip(uploaded_file):
+    uploaded_file.seek(0)
+    try:
+        z = zipfile.ZipFile(uploaded_file, 'r')
+    except zipfile.BadZipFile:
+        raise ValueError("The uploaded file is a corrupted or invalid ZIP archive.")
+
+    txt_files = [f for f in z.namelist() if f.endswith('.txt')]
+    if not txt_files:
+        raise ValueError("No WhatsApp chat (.txt) file found inside the ZIP archive.")
+    return z, txt_files
+
+
+def chat_members(uploaded_file):
+    # Names of the chat files in an upload: every .txt inside a zip, or the file itself.
+    file_type = _file_type(uploaded_file)
+    if file_type == 'zip':
+        return _open_zip(uploaded_file)[1]
+    elif file_type == 'txt':
+        return [uploaded_file.name]
+    else:
+        raise ValueError("Unsupported file type. Please upload a .txt or .zip file.")
+
+
+def get_chat_data_from_file(uploaded_file, member=None):
+    file_type = _file_type(uploaded_file)
+
+    if file_type == 'zip':
+        z, txt_files = _open_zip(uploaded_file)
+        if member is not None and member not in txt_files:
+            raise ValueError(f"{member} is not a chat file in the ZIP archive.")
+        # Members are decompressed as they are read, never extracted in full.
+        return z.open(member if member is not None else txt_files[0])
+
+    elif file_type == 'txt':
+        uploaded_file.seek(0)
+        return uploaded_file
+
+    else:
+        raise ValueError("Unsupported file type. Please upload a .txt or .zip file.")
+
+
+def member_key(cache_key, member):
+    return hashlib.sha256(f"{cache_key}:{member}".encode("utf-8")).hexdigest()
+
+
+def detect_encoding(head):
+    # Returns (codec, BOM length). Without a BOM, UTF-16 shows up as a zero byte in every
+    # other position of ASCII-heavy text like timestamps.
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    even_zeros = head[0::2].count(0)
+    odd_zeros = head[1::2].count(0)
+    if max(even_zeros, odd_zeros) * 4 >= len(head) > 0:
+        return ("utf-16-le" if odd_zeros > even_zeros else "utf-16-be"), 0
+    return "utf-8", 0
+
+
+class _HashingReader(io.RawIOBase):
+    def __init__(self, raw, digest, length=0):
+        self.raw = raw
+        self.digest = digest
+        self.length = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.digest.update(data)
+        self.length += len(data)
+        return len(data)
+
+
+def fingerprint(stream):
+    # A later export of the same chat starts with the same messages, so a hash of the
+    # leading timestamped lines identifies the chat independently of its length.
+    stream.seek(0)
+    head = stream.read(_BLOCK_SIZE)
+    stream.seek(0)
+
+    encoding, bom_length = detect_encoding(head[:ENCODING_SNIFF_BYTES])
+    lines = [line for line in head[bom_length:].decode(encoding, errors="ignore").splitlines()
+             if MESSAGE_START.match(line)][:FINGERPRINT_LINES]
+    if len(lines) < FINGERPRINT_LINES:
+        return None
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def open_text(stream, encoding=None):
+    # Decodes incrementally as the parser reads. The encoding is sniffed from the first
+    # bytes unless the caller already knows it (e.g. when resuming mid-file).
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    if encoding is None:
+        encoding, bom_length = detect_encoding(stream.peek(ENCODING_SNIFF_BYTES)[:ENCODING_SNIFF_BYTES])
+        stream.read(bom_length)
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+def _read_prefix(stream, length, digest):
+    remaining = length
+    while remaining:
+        block = stream.read(min(remaining, _BLOCK_SIZE))
+        if not block:
+            return False
+        digest.update(block)
+        remaining -= len(block)
+    return True
+
+
+def _load_parts(key):
+    df = chat_cache.load(key)
+    if df is None:
+        return None
+    activity = chat_cache.load(key, part="activity")
+    tallies = chat_cache.load(key, part="tallies")
+    if activity is None or tallies is None:
+        return None
+    return df, activity, tallies
+
+
+def _load_base(manifest, stream, digest):
+    # A base parsed by another parser version has a different schema, and one classified with
+    # other keyword lists has stale tallies; parse from scratch.
+    if (manifest is None or manifest.get("parser_version") != PARSER_VERSION
+            or manifest.get("keywords") != KEYWORDS_DIGEST):
+        return None
+    if not _read_prefix(stream, manifest["length"], digest):
+        return None
+    if digest.copy().hexdigest() != manifest["sha256"]:
+        return None
+    return _load_parts(manifest["key"])
+
+
+def load_chat(cache_key, stream):
+    cached = _load_parts(cache_key)
+    if cached is not None:
+        return cached
+
+    chat_id = fingerprint(stream)
+    manifest = chat_cache.load_manifest(chat_id) if chat_id else None
+
+    encoding, _ = detect_encoding(stream.read(ENCODING_SNIFF_BYTES))
+    stream.seek(0)
+
+    digest = hashlib.sha256()
+    base = _load_base(manifest, stream, digest)
+    if base is None:
+        stream.seek(0)
+        digest = hashlib.sha256()
+        reader = _HashingReader(stream, digest)
+        text = open_text(io.BufferedReader(reader))
+    else:
+        # Only the bytes after the previously ingested export are parsed, in the encoding
+        # sniffed from the start of the file.
+        reader = _HashingReader(stream, digest, manifest["length"])
+        text = open_text(io.BufferedReader(reader), encoding)
+
+    if base is None:
+        tail = preprocess(text)
+        formats = {key: tail.attrs.get(key) for key in ("chat_format", "date_order")}
+    else:
+        # The tail alone may not say whether dates are day- or month-first, so it is read
+        # the way the rest of the chat was.
+        formats = {key: manifest.get(key) for key in ("chat_format", "date_order")}
+        tail = preprocess(text, **formats)
+
+    if base is None:
+        df = tail
+        if df.empty:
+            return df, None, None
+        activity = build_activity_cube(df)
+        tallies = build_message_tallies(df)
+    else:
+        df, activity, tallies = base
+        if not tail.empty:
+            tail.index = tail.index + (df.index.max() + 1)
+            df = concat_frames([df, tail])
+            activity = merge_activity_cubes(activity, build_activity_cube(tail))
+            tallies = merge_tallies(tallies, build_message_tallies(tail))
+
+    # Date-range views slice by searchsorted, which needs the rows in time order.
+    if not df['Date-Time'].is_monotonic_increasing:
+        df = df.sort_values('Date-Time', kind='stable', ignore_index=True)
+
+    chat_cache.store(cache_key, df)
+    chat_cache.store(cache_key, activity, part="activity")
+    chat_cache.store(cache_key, tallies, part="tallies")
+    if chat_id:
+        chat_cache.save_manifest(chat_id, {"key": cache_key, "length": reader.length,
+                                           "sha256": digest.hexdigest(), "parser_version": PARSER_VERSION,
+                                           "keywords": KEYWORDS_DIGEST, **formats})
+
+    return df, activity, tallies
+
+
+def combine_frames(frames):
+    # Chat frames from several files of one upload, merged into one time-ordered frame. The
+    # 'chat' column says which file each row came from, so reply times, sessions and
+    # interactions are still worked out within one chat at a time.
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["Date-Time", "User", "Message"])
+    if len(frames) == 1:
+        return frames[0]
+    df = concat_frames(frames)
+    df['chat'] = np.repeat(np.arange(len(frames), dtype=np.int32), [len(frame) for frame in frames])
+    df = df.sort_values('Date-Time', kind='stable', ignore_index=True)
+    df.attrs["unparsed_rows"] = sum(frame.attrs.get("unparsed_rows", 0) for frame in frames)
+    return df
+
+
+def combine_chats(chats):
+    # Same for whole load_chat results; empty chats carry no aggregates and are skipped.
+    chats = [chat for chat in chats if not chat[0].empty]
+    if len(chats) <= 1:
+        return chats[0] if chats else (combine_frames([]), None, None)
+    frames, activities, tallies = zip(*chats)
+    return (combine_frames(frames), functools.reduce(merge_activity_cubes, activities),
+            functools.reduce(merge_tallies, tallies))
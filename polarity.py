@@ -0,0 +1,6 @@
+from textblob import TextBlob
+
+
+# Kept apart from helpers so sentiment worker processes import TextBlob and nothing else.
+def score_polarities(messages):
+    return [TextBlob(msg).sentiment.polarity for msg in messages]
@@ -1,50 +1,332 @@
-import pandas as pd
-import re
-from collections import Counter
-
-def preprocess(data):
-    pattern_12hr = r"(\d{1,2}/\d{1,2}/\d{2,4}), (\d{1,2}:\d{2}\s?[APap][Mm]) - ([^:]+): (.+)"
-    pattern_24hr = r"(\d{1,2}/\d{1,2}/\d{2,4}), (\d{2}:\d{2}) - ([^:]+): (.+)"
-
-    matches_12hr = re.findall(pattern_12hr, data)
-    matches_24hr = re.findall(pattern_24hr, data)
-
-    df = pd.DataFrame()
-
-    if matches_12hr:
-        df = pd.DataFrame(matches_12hr, columns=["Date", "Time", "User", "Message"])
-        try:
-            df["Date-Time"] = pd.to_datetime(df["Date"] + " " + df["Time"],
-                                             format="%d/%m/%Y %I:%M %p", errors="coerce")
-        except:
-             df["Date-Time"] = pd.to_datetime(df["Date"] + " " + df["Time"],
-                                             format="%m/%d/%y %I:%M %p", errors="coerce")
-
-    elif matches_24hr:
-        df = pd.DataFrame(matches_24hr, columns=["Date", "Time", "User", "Message"])
-        df["Date-Time"] = pd.to_datetime(df["Date"] + " " + df["Time"],
-                                         format="%d/%m/%Y %H:%M", errors="coerce")
-
-    else:
-        return pd.DataFrame(columns=["Date-Time", "User", "Message"])
-
-    df = df.dropna(subset=['Date-Time'])
-    df = df[df["User"].str.strip() != ""]
-
-    if df.empty:
-        return df
-
-    df['User'] = df['User'].str.strip().astype(str)
-
-    df["year"] = df["Date-Time"].dt.year
-    df["month"] = df["Date-Time"].dt.month_name()
-    df["day"] = df["Date-Time"].dt.day_name()
-    df["hour"] = df["Date-Time"].dt.hour
-    df["minute"] = df["Date-Time"].dt.minute
-    df['date_only'] = df['Date-Time'].dt.date
-
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
-                  'Friday', 'Saturday', 'Sunday']
-    df['day'] = pd.Categorical(df['day'], categories=days_order, ordered=True)
-
-    return df
+import pandas as pd
+import numpy as np
+import re
+import calendar
+import datetime
+import itertools
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+TIMESTAMP_PATTERNS = {
+    "12hr": re.compile(r"(\d{1,2}/\d{1,2}/\d{2,4}), (\d{1,2}:\d{2}\s?[APap][Mm]) - ([^:]+): (.+)"),
+    "24hr": re.compile(r"(\d{1,2}/\d{1,2}/\d{2,4}), (\d{2}:\d{2}) - ([^:]+): (.+)"),
+}
+
+MESSAGE_START = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}, \d{1,2}:\d{2}")
+
+PARSER_VERSION = 6
+
+MEDIA_PLACEHOLDER = "<Media omitted>"
+LINK_PATTERN = re.compile(r'https?://\S+|www\.\S+|\b[a-zA-Z0-9.-]+\.(?:com|org|net|in|gov|edu|info)\b')
+
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
+              'Friday', 'Saturday', 'Sunday']
+MONTHS_ORDER = list(calendar.month_name)[1:]
+
+# Narrowest dtype that holds each derived column in compact mode.
+COMPACT_DTYPES = {
+    "year": "int16",
+    "hour": "int8",
+    "minute": "int8",
+    "word_count": "int32",
+    "char_len": "int32",
+}
+
+SNIFF_LINES = 300
+CHUNK_SIZE = 100_000
+
+# Parallel parsing holds the whole export in memory as one string, plus the split parts and
+# the copies sent to the workers, so it is opt-in: streams are parsed line by line in flat
+# memory unless CHAT_PARSE_WORKERS is above 1.
+PARSE_WORKERS = int(os.environ.get("CHAT_PARSE_WORKERS", 1))
+# Exports at least this many characters long are split and parsed in a process pool.
+PARALLEL_PARSE_THRESHOLD = 32 << 20
+# Process pools are started from Streamlit's multithreaded server, where forking can copy a
+# lock held by another thread and deadlock the child, so workers never come from fork.
+PROCESS_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# A newline followed by a timestamp: cutting just after it never splits a message.
+_CUT_POINT = re.compile(r"\n(?=" + MESSAGE_START.pattern + ")")
+
+
+def _iter_lines(data):
+    start = 0
+    while start < len(data):
+        end = data.find("\n", start)
+        if end == -1:
+            end = len(data)
+        yield data[start:end]
+        start = end + 1
+
+
+def detect_format(lines):
+    sample = "\n".join(lines)
+    counts = {name: len(pattern.findall(sample)) for name, pattern in TIMESTAMP_PATTERNS.items()}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else None
+
+
+def iter_messages(lines, chat_format):
+    pattern = TIMESTAMP_PATTERNS[chat_format]
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        match = pattern.match(line)
+        if match:
+            if current:
+                yield tuple(current)
+            current = list(match.groups())
+        elif MESSAGE_START.match(line):
+            # timestamped system notice ("X added Y", "Messages are end-to-end encrypted")
+            if current:
+                yield tuple(current)
+            current = None
+        elif current:
+            current[3] += "\n" + line
+    if current:
+        yield tuple(current)
+
+
+def iter_chunks(lines, chunk_size=CHUNK_SIZE, compact=True, arrow_strings=True, chat_format=None, date_order=None):
+    # chat_format and date_order are sniffed from the data unless given, e.g. by a re-export
+    # whose earlier part was already parsed.
+    lines = iter(lines)
+    head = list(itertools.islice(lines, SNIFF_LINES))
+    if chat_format is None:
+        chat_format = detect_format(head)
+
+    if chat_format is None:
+        return
+
+    messages = iter_messages(itertools.chain(head, lines), chat_format)
+    for df in _build_frames(messages, chunk_size, compact, arrow_strings, date_order):
+        df.attrs["chat_format"] = chat_format
+        yield df
+
+
+def _build_frames(messages, chunk_size, compact, arrow_strings, date_order=None):
+    offset = 0
+    while True:
+        batch = list(itertools.islice(messages, chunk_size))
+        if not batch:
+            return
+        df = pd.DataFrame(batch, columns=["Date", "Time", "User", "Message"],
+                          index=pd.RangeIndex(offset, offset + len(batch)))
+        offset += len(batch)
+        if date_order is None:
+            date_order = detect_date_order(df["Date"])
+        df, unparsed = _finalize(df, date_order)
+        if compact:
+            df = compact_frame(df, arrow_strings)
+        df.attrs["unparsed_rows"] = unparsed
+        df.attrs["date_order"] = date_order
+        yield df
+
+
+def split_at_messages(data, parts):
+    # Cut points sit at the start of a timestamped line, so continuation lines stay with
+    # the message they belong to.
+    bounds = [0]
+    for part in range(1, parts):
+        match = _CUT_POINT.search(data, max(len(data) * part // parts, bounds[-1]))
+        if match is None:
+            break
+        bounds.append(match.end())
+    bounds.append(len(data))
+    return [data[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _parse_part(text, chat_format, date_order, chunk_size, compact, arrow_strings):
+    # zip pulls from the messages first, so the counter ends on the number of messages.
+    counter = itertools.count()
+    messages = (message for message, _ in zip(iter_messages(_iter_lines(text), chat_format), counter))
+    frames = list(_build_frames(messages, chunk_size, compact, arrow_strings, date_order))
+    return frames, next(counter)
+
+
+def iter_chunks_parallel(data, workers=PARSE_WORKERS, chunk_size=CHUNK_SIZE, compact=True, arrow_strings=True,
+                         chat_format=None, date_order=None):
+    if chat_format is None:
+        chat_format = detect_format(list(itertools.islice(_iter_lines(data), SNIFF_LINES)))
+    if chat_format is None:
+        return
+
+    parts = split_at_messages(data, workers)
+    if date_order is None:
+        # Same sample a serial parse would use: the first chunk_size messages of the chat.
+        first_messages = iter_messages(itertools.chain.from_iterable(_iter_lines(part) for part in parts),
+                                       chat_format)
+        first_dates = [message[0] for message in itertools.islice(first_messages, chunk_size)]
+        date_order = detect_date_order(pd.Series(first_dates, dtype=object))
+
+    offset = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT) as pool:
+        results = pool.map(_parse_part, parts, itertools.repeat(chat_format), itertools.repeat(date_order),
+                           itertools.repeat(chunk_size), itertools.repeat(compact),
+                           itertools.repeat(arrow_strings))
+        for frames, n_messages in results:
+            # Row labels continue from the previous part, exactly as in a serial parse.
+            for df in frames:
+                df.index = df.index + offset
+                df.attrs["chat_format"] = chat_format
+                yield df
+            offset += n_messages
+
+
+def _read_text(data, workers):
+    # Streams are read whole only when parallel parsing is on and they are big enough to
+    # be worth splitting; otherwise the head goes back in front of the remaining lines.
+    if isinstance(data, str) or workers <= 1 or not hasattr(data, "read"):
+        return data
+    head = data.read(PARALLEL_PARSE_THRESHOLD)
+    if len(head) < PARALLEL_PARSE_THRESHOLD:
+        return itertools.chain(_iter_lines(head), data)
+    return head + data.read()
+
+
+def preprocess(data, chunk_size=CHUNK_SIZE, compact=True, arrow_strings=True, workers=PARSE_WORKERS,
+               chat_format=None, date_order=None):
+    data = _read_text(data, workers)
+    if isinstance(data, str) and workers > 1 and len(data) >= PARALLEL_PARSE_THRESHOLD:
+        chunks = list(iter_chunks_parallel(data, workers, chunk_size, compact, arrow_strings,
+                                           chat_format, date_order))
+    else:
+        lines = _iter_lines(data) if isinstance(data, str) else data
+        chunks = list(iter_chunks(lines, chunk_size, compact, arrow_strings, chat_format, date_order))
+    unparsed = sum(chunk.attrs["unparsed_rows"] for chunk in chunks)
+    # The format and date order the chat was read with, so a later tail can be read the same way.
+    formats = {key: chunks[0].attrs[key] if chunks else None for key in ("chat_format", "date_order")}
+    chunks = [chunk for chunk in chunks if not chunk.empty]
+
+    if chunks:
+        df = concat_frames(chunks)
+    else:
+        df = pd.DataFrame(columns=["Date-Time", "User", "Message"])
+
+    df.attrs["unparsed_rows"] = unparsed
+    df.attrs.update(formats)
+    return df
+
+
+def concat_frames(frames):
+    # Align the User categories first so pd.concat keeps the column categorical.
+    if all(isinstance(df['User'].dtype, pd.CategoricalDtype) for df in frames):
+        users = sorted(set().union(*(df['User'].cat.categories for df in frames)))
+        frames = [df.assign(User=df['User'].cat.set_categories(users)) for df in frames]
+    return pd.concat(frames)
+
+
+def compact_frame(df, arrow_strings=True):
+    if df.empty:
+        return df
+
+    df = df.drop(columns=["Date", "Time"], errors="ignore")
+    df['User'] = df['User'].astype('category')
+    df['month'] = pd.Categorical(df['month'], categories=MONTHS_ORDER, ordered=True)
+    df['date_only'] = df['Date-Time'].dt.normalize()
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    if arrow_strings:
+        df['Message'] = df['Message'].astype("string[pyarrow]")
+    return df
+
+
+def memory_report(df, compacted=None):
+    if compacted is None:
+        compacted = compact_frame(df)
+    report = pd.DataFrame({
+        "before": df.memory_usage(deep=True, index=False),
+        "after": compacted.memory_usage(deep=True, index=False),
+    }).fillna(0).astype("int64")
+    report.loc["Total"] = report.sum()
+    report["saved %"] = (100 * (1 - report["after"] / report["before"].where(report["before"] > 0))).round(1)
+    return report
+
+
+def detect_date_order(dates):
+    # A first field above 12 can only be a day, a second field above 12 only a day of a
+    # month-first date. Exports where neither occurs keep the day-first default.
+    for date in pd.unique(dates):
+        parts = date.split("/")
+        if int(parts[0]) > 12:
+            return "DMY"
+        if int(parts[1]) > 12:
+            return "MDY"
+    return "DMY"
+
+
+def _parse_date(text, date_order):
+    first, second, year = (int(part) for part in text.split("/"))
+    day, month = (first, second) if date_order == "DMY" else (second, first)
+    if year < 100:
+        year += 2000
+    try:
+        return np.datetime64(datetime.date(year, month, day), "m")
+    except ValueError:
+        return np.datetime64("NaT", "m")
+
+
+def _parse_time(text):
+    clock = text.strip()
+    suffix = clock[-2:].lower()
+    if suffix in ("am", "pm"):
+        clock = clock[:-2].strip()
+    hours, minutes = (int(part) for part in clock.split(":"))
+
+    if suffix in ("am", "pm"):
+        if not 1 <= hours <= 12:
+            return np.timedelta64("NaT", "m")
+        hours = hours % 12 + (12 if suffix == "pm" else 0)
+
+    if hours > 23 or minutes > 59:
+        return np.timedelta64("NaT", "m")
+    return np.timedelta64(hours * 60 + minutes, "m")
+
+
+def parse_timestamps(dates, times, date_order="DMY"):
+    # Exports repeat a few thousand distinct dates and at most 1440 distinct times, so
+    # each distinct string is parsed once and broadcast back with integer codes.
+    date_codes, unique_dates = pd.factorize(dates)
+    time_codes, unique_times = pd.factorize(times)
+
+    parsed_dates = np.array([_parse_date(date, date_order) for date in unique_dates], dtype="datetime64[m]")
+    parsed_times = np.array([_parse_time(time) for time in unique_times], dtype="timedelta64[m]")
+
+    return (parsed_dates[date_codes] + parsed_times[time_codes]).astype("datetime64[ns]")
+
+
+def _finalize(df, date_order):
+    df["Date-Time"] = parse_timestamps(df["Date"], df["Time"], date_order)
+    unparsed = int(df["Date-Time"].isna().sum())
+
+    df = df.dropna(subset=['Date-Time'])
+    df = df[df["User"].str.strip() != ""]
+
+    if df.empty:
+        return df, unparsed
+
+    df['User'] = df['User'].str.strip().astype(str)
+
+    df["year"] = df["Date-Time"].dt.year
+    df["month"] = df["Date-Time"].dt.month_name()
+    df["day"] = df["Date-Time"].dt.day_name()
+    df["hour"] = df["Date-Time"].dt.hour
+    df["minute"] = df["Date-Time"].dt.minute
+    df['date_only'] = df['Date-Time'].dt.date
+
+    df['day'] = pd.Categorical(df['day'], categories=DAYS_ORDER, ordered=True)
+
+    return add_message_features(df), unparsed
+
+
+def add_message_features(df):
+    messages = df['Message']
+    df['word_count'] = messages.str.count(r"\S+")
+    df['char_len'] = messages.str.len()
+    df['is_media'] = messages.str.contains(MEDIA_PLACEHOLDER, regex=False)
+    df['has_link'] = messages.str.contains(LINK_PATTERN)
+    return df
@@ -0,0 +1,100 @@
+import contextlib
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import time
+
+PROFILE_ENABLED = os.environ.get("ANALYZER_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_LOG = os.environ.get("ANALYZER_PROFILE_LOG", "performance.jsonl")
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:
+    _PyinstrumentProfiler = None
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class StageTimer:
+    def __init__(self, enabled=PROFILE_ENABLED):
+        self.enabled = enabled
+        self.records = []
+        # Written with every log record (upload key, selected user) to trace it to a rerun.
+        self.context = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, concurrent=False):
+        # Concurrent stages run on pool threads and overlap each other, so only their wall
+        # time means anything: process CPU and RSS are shared. They sit inside an enclosing
+        # stage and are left out of the total.
+        if not self.enabled:
+            yield
+            return
+
+        rss_before = None if concurrent else _rss_bytes()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            rss_after = None if concurrent else _rss_bytes()
+            self.records.append({
+                "stage": name,
+                "concurrent": concurrent,
+                "wall_s": round(time.perf_counter() - wall_start, 4),
+                "cpu_s": None if concurrent else round(time.process_time() - cpu_start, 4),
+                "rss_delta_mb": round((rss_after - rss_before) / (1 << 20), 2)
+                if rss_before is not None and rss_after is not None else None,
+            })
+
+    def total_wall(self):
+        return sum(record["wall_s"] for record in self.records if not record["concurrent"])
+
+    def write_log(self, path=PROFILE_LOG, **context):
+        if not self.records:
+            return
+        timestamp = datetime.datetime.now().isoformat(timespec="milliseconds")
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                for record in self.records:
+                    f.write(json.dumps({"timestamp": timestamp, **context, **record}) + "\n")
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def profile_rerun(enabled=True):
+    # Yields a dict whose "report" holds a text profile once the block exits.
+    result = {"report": None}
+    if not enabled:
+        yield result
+        return
+
+    if _PyinstrumentProfiler is not None:
+        profiler = _PyinstrumentProfiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result["report"] = profiler.output_text(unicode=True)
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+        result["report"] = stream.getvalue()
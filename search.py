@@ -0,0 +1,156 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Anything that is not a letter, mark, digit or underscore separates tokens. Marks are kept
+# so scripts like Devanagari stay whole words.
+SEPARATOR = r"[^\pL\pM\pN_]+"
+RESULTS_PER_PAGE = 25
+
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(texts):
+    lowered = pc.utf8_lower(pa.array(texts, type=pa.string()))
+    spaced = pc.utf8_trim_whitespace(pc.replace_substring_regex(lowered, SEPARATOR, " "))
+    return pc.utf8_split_whitespace(spaced)
+
+
+def _words(text):
+    return [word for word in tokenize([text])[0].as_py() if word]
+
+
+# Inverted index over the chat frame: every distinct token maps to the sorted row positions
+# of the messages containing it, stored as one flat array sliced by offsets. The vocabulary
+# is sorted so prefix queries are a searchsorted range.
+def build_search_index(df):
+    tokens = tokenize(df['Message'])
+    if isinstance(tokens, pa.ChunkedArray):
+        tokens = tokens.combine_chunks()
+    flat = pc.list_flatten(tokens)
+    # Messages with no words at all split into a single empty token.
+    words = pc.not_equal(flat, "")
+    parents = pc.list_parent_indices(tokens).filter(words).to_numpy().astype(np.int64)
+
+    encoded = pc.dictionary_encode(flat.filter(words))
+    vocab = np.array(encoded.dictionary.to_pylist(), dtype=object)
+    order_vocab = np.argsort(vocab, kind='stable')
+    rank = np.empty_like(order_vocab)
+    rank[order_vocab] = np.arange(len(order_vocab))
+    codes = rank[encoded.indices.to_numpy().astype(np.int64)]
+
+    # Rows already come in order, so a stable sort by token gives (token, row) order;
+    # repeats of a token within one message are then adjacent and dropped.
+    order = np.argsort(codes, kind='stable')
+    codes, rows = codes[order], parents[order]
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+    codes, rows = codes[first], rows[first]
+
+    messages = pa.array(df['Message'], type=pa.string())
+    return {
+        "vocab": vocab[order_vocab],
+        "offsets": np.searchsorted(codes, np.arange(len(vocab) + 1)),
+        "postings": rows.astype(np.int32 if len(df) < 2 ** 31 else np.int64),
+        "timestamps": df['Date-Time'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+        "users": pd.Categorical(df['User']),
+        "messages": messages.combine_chunks() if isinstance(messages, pa.ChunkedArray) else messages,
+    }
+
+
+def parse_query(query):
+    # Quoted text is a phrase, a trailing * makes a prefix, everything else is a keyword.
+    # All parts must match.
+    phrases, terms, prefixes = [], [], []
+    for phrase, word in _QUERY_PART.findall(query):
+        if phrase:
+            phrases.append(phrase)
+        elif word.endswith("*") and word.rstrip("*"):
+            prefixes.extend(_words(word.rstrip("*")))
+        else:
+            terms.extend(_words(word))
+    return phrases, terms, prefixes
+
+
+def _postings(index, lo, hi):
+    offsets = index["offsets"]
+    return index["postings"][offsets[lo]:offsets[hi]]
+
+
+def _term_rows(index, term):
+    lo = np.searchsorted(index["vocab"], term, side='left')
+    if lo == len(index["vocab"]) or index["vocab"][lo] != term:
+        return np.empty(0, dtype=index["postings"].dtype)
+    return _postings(index, lo, lo + 1)
+
+
+def _prefix_rows(index, prefix):
+    vocab = index["vocab"]
+    lo = np.searchsorted(vocab, prefix, side='left')
+    hi = np.searchsorted(vocab, prefix + "\U0010ffff", side='left')
+    if hi - lo <= 1:
+        return _postings(index, lo, hi)
+    # Union of several posting lists: a row mask is linear and avoids sorting the concatenation.
+    matched = np.zeros(len(index["timestamps"]), dtype=bool)
+    matched[_postings(index, lo, hi)] = True
+    return np.flatnonzero(matched)
+
+
+def _phrase_rows(index, phrase):
+    words = _words(phrase)
+    if not words:
+        return None
+    rows = _intersect([_term_rows(index, word) for word in words])
+    if len(words) == 1 or len(rows) == 0:
+        return rows
+    # The postings only say every word occurs; check that they occur next to each other.
+    pattern = (r"(^|" + SEPARATOR + ")" + SEPARATOR.join(re.escape(word) for word in words)
+               + r"($|" + SEPARATOR + ")")
+    candidates = pc.utf8_lower(index["messages"].take(rows))
+    matched = pc.match_substring_regex(candidates, pattern).to_numpy(zero_copy_only=False)
+    return rows[matched]
+
+
+def _intersect(row_sets):
+    row_sets = sorted(row_sets, key=len)
+    rows = row_sets[0]
+    for other in row_sets[1:]:
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+
+def search_messages(index, query, selected_user="Overall Chat", start=None, end=None):
+    phrases, terms, prefixes = parse_query(query)
+    row_sets = [_term_rows(index, term) for term in terms]
+    row_sets += [_prefix_rows(index, prefix) for prefix in prefixes]
+    row_sets += [rows for rows in (_phrase_rows(index, phrase) for phrase in phrases) if rows is not None]
+    if not row_sets:
+        return np.empty(0, dtype=np.int64)
+
+    rows = _intersect(row_sets)
+    if selected_user != "Overall Chat":
+        user_code = index["users"].categories.get_indexer([selected_user])[0]
+        rows = rows[index["users"].codes[rows] == user_code]
+    if start is not None:
+        rows = rows[index["timestamps"][rows] >= pd.Timestamp(start).value]
+    if end is not None:
+        rows = rows[index["timestamps"][rows] < pd.Timestamp(end).value]
+    return rows.astype(np.int64)
+
+
+def monthly_hits(index, rows):
+    months, counts = np.unique(index["timestamps"][rows].astype('datetime64[ns]').astype('datetime64[M]'),
+                               return_counts=True)
+    return pd.DataFrame({'Month': months.astype('datetime64[ns]'), 'Hits': counts})
+
+
+def results_page(index, rows, page, per_page=RESULTS_PER_PAGE):
+    page_rows = rows[(page - 1) * per_page:page * per_page]
+    return pd.DataFrame({
+        'Date-Time': index["timestamps"][page_rows].astype('datetime64[ns]'),
+        'User': index["users"][page_rows].astype(str),
+        'Message': index["messages"].take(page_rows).to_pylist(),
+    })